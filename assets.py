@@ -0,0 +1,88 @@
+import pygame
+
+def display_ready():
+    """Return True when the display mode is set, so surfaces can be converted."""
+    return pygame.display.get_init() and pygame.display.get_surface() is not None
+
+def convert_surface(surface):
+    """Return copy of the surface in the display pixel format.
+    Surfaces with per-pixel alpha keep it, colorkeys are RLE accelerated."""
+    if surface.get_flags() & pygame.SRCALPHA:
+        converted = surface.convert_alpha()
+    else:
+        converted = surface.convert()
+    colorkey = surface.get_colorkey()
+    if colorkey is not None:
+        converted.set_colorkey(colorkey, pygame.RLEACCEL)
+    return converted
+
+class TransformCache:
+    """Cache of scaled and flipped variants of animation frames.
+    Variants are made once (at level load or first use) and served by key,
+    so no pygame.transform call is needed while the game is running."""
+    def __init__(self):
+        self.variants = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frames, size = None, flip_x = False, flip_y = False):
+        key = (frames, size, flip_x, flip_y)
+        variant = self.variants.get(key)
+        if variant is not None:
+            self.hits += 1
+            return variant
+
+        self.misses += 1
+        variant = []
+        for frame in frames:
+            if size is not None:
+                frame = pygame.transform.scale(frame, size)
+            if flip_x or flip_y:
+                frame = pygame.transform.flip(frame, flip_x, flip_y)
+            variant.append(frame)
+        variant = tuple(variant)
+        self.variants[key] = variant
+        return variant
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'variants': len(self.variants),
+        }
+
+TRANSFORM_CACHE = TransformCache()
+
+class FrameAtlas:
+    """Cache of animation frames sliced from spritesheets.
+    Every strip is sliced once per process and all entities share the same
+    tuple of frames, so frames must not be modified."""
+    def __init__(self):
+        self.frames = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sheet, x, y, width, height, rows, columns, flip = False):
+        key = (sheet, x, y, width, height, rows, columns, flip)
+        frames = self.frames.get(key)
+        if frames is not None:
+            self.hits += 1
+            return frames
+
+        self.misses += 1
+        if flip:
+            frames = TRANSFORM_CACHE.get(self.get(sheet, x, y, width, height, rows, columns), flip_x = True)
+        else:
+            frames = tuple(sheet.slice_sprites(x, y, width, height, rows, columns))
+        self.frames[key] = frames
+        return frames
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'strips': len(self.frames),
+            'frames': sum(len(frames) for frames in self.frames.values()),
+        }
+
+FRAME_ATLAS = FrameAtlas()
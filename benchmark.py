@@ -0,0 +1,370 @@
+"""Benchmarks of the game subsystems.
+Run from the repository directory, e.g. python benchmark.py broadphase"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import pygame
+from config import *
+from spatial import Broadphase, merge_tiles
+from scores import SqliteScoreStore
+from levelcache import LevelCache
+from levelfile import write_level_file
+
+def level_tiles(level):
+    """Return group with a plain sprite for every block of the level."""
+    tiles = pygame.sprite.Group()
+    for i, row in enumerate(level):
+        for j, column in enumerate(row):
+            if column == "B":
+                tile = pygame.sprite.Sprite(tiles)
+                tile.rect = pygame.Rect(j * TILESIZE, i * TILESIZE, TILESIZE, TILESIZE)
+    return tiles
+
+def count_colliders():
+    """Number of brick tiles and of colliders they are merged into, for every level."""
+    print(f"{'level':>6} {'bricks':>8} {'colliders':>10}")
+    for index, level in enumerate(levels):
+        bricks = sum(row.count("B") for row in level)
+        print(f"{index:>6} {bricks:>8} {len(merge_tiles(level, 'B')):>10}")
+
+def bench_level_cache():
+    """Time of compiling every level and of loading it from the compiled file."""
+    print(f"{'level':>6} {'bytes':>8} {'compile ms':>11} {'load ms':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for index in range(len(levels)):
+            cache = LevelCache(directory, levels, start_position, enemy_positions, boss_positions,
+                               potions_positions, swords_positions)
+            start = time.perf_counter()
+            cache.load(index)
+            compiled = time.perf_counter() - start
+
+            cache = LevelCache(directory, levels, start_position, enemy_positions, boss_positions,
+                               potions_positions, swords_positions)
+            start = time.perf_counter()
+            cache.load(index)
+            loaded = time.perf_counter() - start
+            size = os.path.getsize(cache.path(index))
+            print(f"{index:>6} {size:>8} {compiled * 1000:>11.3f} {loaded * 1000:>9.3f}")
+
+def synthetic_level(columns, rows, seed):
+    """Return rows of a walled map with random brick platforms and spikes on them."""
+    rng = random.Random(seed)
+    tilemap = [['B'] + ['.'] * (columns - 2) + ['B'] for _ in range(rows)]
+    tilemap[0] = tilemap[-1] = ['B'] * columns
+    for _ in range(columns * rows // 40):
+        x, y, length = rng.randrange(1, columns - 9), rng.randrange(3, rows - 1), rng.randrange(3, 9)
+        tilemap[y][x:x + length] = ['B'] * length
+        if rng.random() < 0.3 and tilemap[y - 1][x + 1] == '.':
+            tilemap[y - 1][x + 1] = 'S'
+    return [''.join(row) for row in tilemap]
+
+def bench_camera(columns, rows, frames):
+    """Draw time of a large level while the camera pans across it, blitting every
+    sprite versus culling sprites out of the view. The chunk world of the level
+    follows the camera like it follows the player."""
+    from levels import Level
+    from render import Renderer, Camera
+    screen = pygame.Surface((WIDTH, HEIGHT))
+    path = os.path.join(tempfile.gettempdir(), f"synthetic_{columns}x{rows}.lvl")
+    write_level_file(path, synthetic_level(columns, rows, 0), (1, 1), [], [], [], [])
+    level = Level(path, GAME_BACKGROUND).build()
+
+    camera = Camera(WIDTH, HEIGHT)
+    camera.set_bounds(*level.size)
+    renderer = Renderer(screen, False)
+    target = pygame.sprite.Sprite()
+    target.rect = pygame.Rect(0, level.size[1] // 2, TILESIZE, TILESIZE)
+    step = max(1, (level.size[0] - WIDTH) // frames)
+    print(f"level {columns}x{rows} tiles, {len(level.objects)} objects, {len(level.colliders)} colliders")
+
+    def pan(draw):
+        target.rect.x = 0
+        drawn = 0
+        start = time.perf_counter()
+        for _ in range(frames):
+            target.rect.x += step
+            level.world.update(target.rect)
+            camera.follow(target)
+            drawn += draw()
+        return (time.perf_counter() - start) / frames * 1000, drawn / frames
+
+    def draw_all():
+        level.static_layer.draw(screen, camera.rect)
+        sprites = level.all_sprites.sprites()
+        for sprite in sprites:
+            screen.blit(sprite.image, camera.apply(sprite.rect))
+        return len(sprites)
+
+    def draw_culled():
+        renderer.draw(level.static_layer, level.all_sprites, lambda surface: [], camera)
+        return len(camera.visible(level.all_sprites))
+
+    print(f"{'mode':>10} {'ms/frame':>10} {'sprites':>9}")
+    for mode, draw in (('all', draw_all), ('culled', draw_culled)):
+        frame_time, drawn = pan(draw)
+        print(f"{mode:>10} {frame_time:>10.3f} {drawn:>9.0f}")
+
+def bench_chunks(columns, rows, steps):
+    """Living sprites and cost of chunk streaming while the player walks across a large level."""
+    from levels import Level
+    path = os.path.join(tempfile.gettempdir(), f"synthetic_{columns}x{rows}.lvl")
+    write_level_file(path, synthetic_level(columns, rows, 0), (1, 1), [], [], [], [])
+    level = Level(path, GAME_BACKGROUND).build()
+    world = level.world
+    player = pygame.sprite.Sprite()
+    player.rect = pygame.Rect(0, level.size[1] // 2, TILESIZE, TILESIZE)
+    print(f"level {columns}x{rows} tiles, {len(level.objects)} objects, chunks of {CHUNK_SIZE} tiles, radius {CHUNK_RADIUS}")
+
+    step = max(1, level.size[0] // steps)
+    most = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        player.rect.x += step
+        world.update(player.rect)
+        most = max(most, len(level.all_sprites))
+    elapsed = time.perf_counter() - start
+    print(f"most living sprites {most}, {elapsed / steps * 1000:.3f} ms per step")
+    for name, value in world.stats().items():
+        print(f"{name:>14} {value}")
+
+def falling_bricks(count, seed):
+    rng = random.Random(seed)
+    bricks = pygame.sprite.Group()
+    for _ in range(count):
+        brick = pygame.sprite.Sprite(bricks)
+        brick.rect = pygame.Rect(rng.randrange(WIDTH - TILESIZE), rng.randrange(HEIGHT - TILESIZE), TILESIZE, TILESIZE // 2)
+    return bricks
+
+def bench_broadphase(counts, frames):
+    """Per-frame cost of every falling brick asking what it collides with,
+    with a linear scan of all sprites and with the broadphase."""
+    tiles = level_tiles(level1_2)
+    print(f"{'bricks':>8} {'linear ms':>12} {'broadphase ms':>14} {'speedup':>8}")
+    for count in counts:
+        bricks = falling_bricks(count, count)
+        all_sprites = pygame.sprite.Group(tiles, bricks)
+        start = time.perf_counter()
+        for _ in range(frames):
+            for brick in bricks:
+                brick.rect.y += 1
+                [sprite for sprite in pygame.sprite.spritecollide(brick, all_sprites, False) if sprite != brick]
+        linear = (time.perf_counter() - start) / frames
+
+        bricks = falling_bricks(count, count)
+        broadphase = Broadphase(tiles, bricks, 4 * TILESIZE, TILESIZE)
+        start = time.perf_counter()
+        for _ in range(frames):
+            broadphase.rebuild()
+            for brick in bricks:
+                brick.rect.y += 1
+                broadphase.collide(brick)
+        bucketed = (time.perf_counter() - start) / frames
+
+        print(f"{count:>8} {linear * 1000:>12.3f} {bucketed * 1000:>14.3f} {linear / bucketed:>7.1f}x")
+
+def bench_menu_idle(seconds):
+    """CPU time used by the idle main menu, polling every frame versus event-driven."""
+    import menu
+    print(f"{'mode':>14} {'cpu %':>8} {'renders':>8}")
+    for event_driven in (False, True):
+        menu.MENU_EVENT_DRIVEN = event_driven
+        idle_menu = menu.Menu()
+        pygame.time.set_timer(pygame.QUIT, int(seconds * 1000), 1)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        idle_menu.run()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        mode = 'event-driven' if event_driven else 'polling'
+        print(f"{mode:>14} {100 * cpu / wall:>8.1f} {idle_menu.renders:>8}")
+
+def latency(function, samples):
+    """Return (p50, p99) of function call time in ms."""
+    times = []
+    for i in range(samples):
+        start = time.perf_counter()
+        function(i)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1]
+
+def bench_scores(rows, samples):
+    """Insert and query latency of the SQLite leaderboard holding many finished runs."""
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteScoreStore(os.path.join(directory, 'scores.db'), SCORES_COUNT)
+        start = time.perf_counter()
+        with store.connection:
+            store.connection.executemany("INSERT INTO runs (id, name, time, score, finished) VALUES (?, ?, ?, ?, 0)",
+                                         ((i, f"player{rng.randrange(rows // 100 + 1)}", '0:00', rng.randrange(TIME))
+                                          for i in range(1, rows + 1)))
+            store.connection.executemany("INSERT INTO splits (run_id, level, time) VALUES (?, ?, ?)",
+                                         ((i, level, rng.randrange(TIME // LAST_LEVEL_INDEX))
+                                          for i in range(1, rows + 1) for level in range(LAST_LEVEL_INDEX)))
+        print(f"filled {rows} runs in {time.perf_counter() - start:.1f} s")
+
+        splits = [rng.randrange(TIME // LAST_LEVEL_INDEX) for _ in range(LAST_LEVEL_INDEX)]
+        results = [
+            ('insert run', latency(lambda i: store.add(f"bench{i}", '0:00', rng.randrange(TIME), splits), samples)),
+            ('top 10', latency(lambda i: store.top(10), samples)),
+            ('top 10 cached', latency(lambda i: store.load(), samples)),
+            ('best of name', latency(lambda i: store.best_of(f"player{i}"), samples)),
+            ('best split', latency(lambda i: store.best_splits(i % LAST_LEVEL_INDEX, 10), samples)),
+        ]
+        store.close()
+
+    print(f"{'query':>14} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, (p50, p99) in results:
+        print(f"{name:>14} {p50:>10.3f} {p99:>10.3f}")
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {name: round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 4)
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+
+def run_level(index, script, ticks, trace):
+    """Run the level headlessly for at most ticks steps, drawing every step. It stops
+    earlier if the level is left or lost. Returns update and draw times in ms and sprite
+    counts per step, with trace also the peak of memory allocated in every step in KB."""
+    from headless import new_game
+    from inputs import ScriptedInput
+    game = new_game(ScriptedInput(script, loop = True), index, seed = 0)
+    game.show_special_image_flag = False
+    samples = {'update': [], 'draw': [], 'sprites': [], 'allocated': []}
+    if trace:
+        tracemalloc.start()
+    for _ in range(ticks):
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        game.step()
+        updated = time.perf_counter()
+        if game.current_level_index != index or game.new_record or game.game_over_flag or not game.playing:
+            break
+        game.render()
+        drawn = time.perf_counter()
+        if trace:
+            samples['allocated'].append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        samples['update'].append((updated - start) * 1000)
+        samples['draw'].append((drawn - updated) * 1000)
+        samples['sprites'].append(len(game.all_sprites))
+    if trace:
+        tracemalloc.stop()
+    game.level_loader.shutdown()
+    return samples
+
+def bench_levels(ticks, script, output):
+    """Update and draw time percentiles, sprite counts and allocations of every level
+    over a scripted run, written to a JSON file. Every level runs twice: timed, then
+    with tracemalloc counting allocations."""
+    from headless import init_headless
+    init_headless()
+    results = {'ticks': ticks, 'levels': {}}
+    print(f"{'level':>6} {'ticks':>6} {'update p50/p95/p99 ms':>23} {'draw p50/p95/p99 ms':>21} {'sprites':>8} {'alloc KB':>9}")
+    for index in range(len(levels)):
+        samples = run_level(index, script, ticks, False)
+        allocated = run_level(index, script, ticks, True)['allocated']
+        result = {
+            'ticks': len(samples['update']),
+            'update_ms': percentiles(samples['update']),
+            'draw_ms': percentiles(samples['draw']),
+            'sprites': {'mean': round(statistics.mean(samples['sprites']), 1), 'max': max(samples['sprites'])},
+            'allocated_kb': percentiles(allocated),
+        }
+        results['levels'][str(index)] = result
+        update, draw = result['update_ms'], result['draw_ms']
+        print(f"{index:>6} {result['ticks']:>6} "
+              f"{update['p50']:>7.3f}/{update['p95']:>7.3f}/{update['p99']:>7.3f} "
+              f"{draw['p50']:>6.3f}/{draw['p95']:>6.3f}/{draw['p99']:>7.3f} "
+              f"{result['sprites']['max']:>8} {result['allocated_kb']['p99']:>9.1f}")
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"written to {output}")
+    return results
+
+def compare_levels(results, baseline, threshold, noise = 0.05):
+    """Return the regressions against the baseline results: (level, metric, old ms, new ms)
+    for every p50 or p95 time which is threshold (a fraction) and noise ms slower."""
+    regressions = []
+    for level, result in results['levels'].items():
+        old = baseline['levels'].get(level)
+        if old is None:
+            continue
+        for metric in ('update_ms', 'draw_ms'):
+            for percentile in ('p50', 'p95'):
+                before, after = old[metric][percentile], result[metric][percentile]
+                if after > before * (1 + threshold) and after - before > noise:
+                    regressions.append((level, f"{metric[:-3]} {percentile}", before, after))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    broadphase = subparsers.add_parser('broadphase', help=bench_broadphase.__doc__)
+    broadphase.add_argument('--counts', type=int, nargs='+', default=[14, 50, 100, 200, 400, 800])
+    broadphase.add_argument('--frames', type=int, default=60)
+
+    camera = subparsers.add_parser('camera', help=bench_camera.__doc__)
+    camera.add_argument('--columns', type=int, default=500)
+    camera.add_argument('--rows', type=int, default=100)
+    camera.add_argument('--frames', type=int, default=300)
+
+    chunks = subparsers.add_parser('chunks', help=bench_chunks.__doc__)
+    chunks.add_argument('--columns', type=int, default=2000)
+    chunks.add_argument('--rows', type=int, default=100)
+    chunks.add_argument('--steps', type=int, default=1000)
+
+    subparsers.add_parser('colliders', help=count_colliders.__doc__)
+
+    subparsers.add_parser('level-cache', help=bench_level_cache.__doc__)
+
+    levels_parser = subparsers.add_parser('levels', help=bench_levels.__doc__)
+    levels_parser.add_argument('--ticks', type=int, default=1800)
+    levels_parser.add_argument('--recording', help="replay the keys of this recording instead of the demo script")
+    levels_parser.add_argument('--output', default='frame_times.json')
+    levels_parser.add_argument('--baseline', help="results to compare with, regressions make the exit status 1")
+    levels_parser.add_argument('--threshold', type=float, default=0.1)
+
+    menu_idle = subparsers.add_parser('menu-idle', help=bench_menu_idle.__doc__)
+    menu_idle.add_argument('--seconds', type=float, default=5)
+
+    scores = subparsers.add_parser('scores', help=bench_scores.__doc__)
+    scores.add_argument('--rows', type=int, default=1000000)
+    scores.add_argument('--samples', type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.benchmark == 'broadphase':
+        bench_broadphase(args.counts, args.frames)
+    elif args.benchmark == 'camera':
+        bench_camera(args.columns, args.rows, args.frames)
+    elif args.benchmark == 'chunks':
+        bench_chunks(args.columns, args.rows, args.steps)
+    elif args.benchmark == 'colliders':
+        count_colliders()
+    elif args.benchmark == 'level-cache':
+        bench_level_cache()
+    elif args.benchmark == 'levels':
+        from headless import DEMO_SCRIPT
+        from replay import Recording
+        script = Recording.load(args.recording).script() if args.recording else DEMO_SCRIPT
+        results = bench_levels(args.ticks, script, args.output)
+        if args.baseline:
+            with open(args.baseline) as file:
+                regressions = compare_levels(results, json.load(file), args.threshold)
+            for level, metric, before, after in regressions:
+                print(f"regression: level {level} {metric} {before:.3f} -> {after:.3f} ms")
+            print(f"{len(regressions)} regressions against {args.baseline}")
+            if regressions:
+                sys.exit(1)
+    elif args.benchmark == 'menu-idle':
+        bench_menu_idle(args.seconds)
+    elif args.benchmark == 'scores':
+        bench_scores(args.rows, args.samples)
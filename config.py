@@ -1,7 +1,13 @@
 import pygame
 from enum import Enum
-import json
+import functools
 import os
+from sounds import SoundBank
+from fonts import TextCache
+from scores import open_score_store
+from levelcache import LevelCache
+from assets import display_ready, convert_surface, FRAME_ATLAS, TRANSFORM_CACHE
+from profiling import profiled
 
 current_dir = os.path.dirname(__file__)
 
@@ -9,14 +15,24 @@ class Spritesheet:
     """ Class for loading spritesheets."""
     def __init__(self, file):
         self.sheet = pygame.image.load(file)
+
+    def convert(self):
+        self.sheet = convert_surface(self.sheet)
         
     def get_sprite(self, x, y, width, height):
         sprite = pygame.Surface([width,height])
+        if display_ready():
+            sprite = sprite.convert()
         sprite.blit(self.sheet, (0,0), (x,y, width, height))
-        sprite.set_colorkey(BLACK)
+        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
         return sprite
     
-    def get_sprites(self, start_x, start_y, width, height, rows, columns):
+    @profiled
+    def get_sprites(self, start_x, start_y, width, height, rows, columns, flip = False):
+        """Return shared tuple of frames, sliced only on the first call."""
+        return FRAME_ATLAS.get(self, start_x, start_y, width, height, rows, columns, flip)
+
+    def slice_sprites(self, start_x, start_y, width, height, rows, columns):
         sprites = []
         for row in range(rows):
             for col in range(columns):
@@ -31,12 +47,12 @@ class PotionType(Enum):
     NOFALL = 3
     NODAMAGE = 4
 
+@profiled
 def play_sound(path,volume):
-    channel = pygame.mixer.find_channel()
-    sound = pygame.mixer.Sound(path)
-    sound.set_volume(volume)
+    if not pygame.mixer.get_init():
+        return
     pygame.mixer.music.pause()
-    channel.play(sound)
+    SOUND_BANK.play(path, volume)
     pygame.mixer.music.unpause()
 
 def play_music(path):
@@ -45,26 +61,68 @@ def play_music(path):
         pygame.mixer.music.play(-1)
         pygame.mixer.music.set_volume(0.3)
 
+def convert_assets():
+    """Convert all loaded images and spritesheets to the display pixel format.
+    It has to be called after the display mode is set and before importing modules
+    which take the images from config. Returns the number of converted surfaces."""
+    module = globals()
+    converted = 0
+    for name in IMAGE_NAMES:
+        module[name] = convert_surface(module[name])
+        converted += 1
+    for images in (FALLING_IMAGES, SPECIAL_IMAGES):
+        images[:] = [convert_surface(image) for image in images]
+        converted += len(images)
+    for sheet in SPRITESHEETS:
+        sheet.convert()
+        converted += 1
+    ASSET_STATS['converted'] = converted
+    return converted
+
+def level_transitions(index):
+    """Return the special image shown before the level of the tables and the index of
+    the next level, None when there is no image or the level is the last one."""
+    intro = ([0] + NEW_LEVEL_INDEX).index(index) if index == 0 or index in NEW_LEVEL_INDEX else None
+    following = index + 1 if index + 1 < LAST_LEVEL_INDEX else None
+    return intro, following
+
 def count_time(time):
     minutes = time // 60000
     seconds = (time % 60000) // 1000
     return minutes, seconds
     
+@functools.cache
+def score_store():
+    """Return the score store, opened on first use so importing config creates no files."""
+    return open_score_store(SCORES_BACKEND, SCORES_FILE, SCORES_DATABASE, SCORES_COUNT)
+
 def load_scores():
-    try:
-        with open(SCORES_FILE, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return []
+    return score_store().load()
 
 def save_scores(scores):
-    with open(SCORES_FILE, 'w') as file:
-        json.dump(scores, file, indent=4)
+    score_store().replace(scores)
+
+def add_score(name, time, score, splits = ()):
+    score_store().add(name, time, score, splits)
 
 # Constants
 WIDTH = 1280
 HEIGHT = 800
 FPS = 30
+# The simulation runs TICK_RATE steps per second whatever the frame rate is, after a slow
+# frame at most MAX_CATCH_UP_STEPS are run at once. RENDER_FPS 0 draws as fast as possible.
+TICK_RATE = FPS
+MAX_CATCH_UP_STEPS = 5
+# Every level has its own virtual clock starting at LEVEL_START_TICKS ms, longer than
+# any cooldown of the sprites, so sprites can be created before the level is entered
+LEVEL_START_TICKS = 60000
+RENDER_FPS = FPS
+VSYNC = False
+# Performance overlay shown at the start of the game, F3 toggles it while playing
+PERFORMANCE_OVERLAY = False
+# Games started from the menu are recorded to RECORDINGS_DIRECTORY, see replay.py
+RECORD_GAMES = False
+RECORDINGS_DIRECTORY = "recordings"
 TILESIZE = 32
 TIME = 10 * 60 * 1000 
 BLUE = (0, 0, 255)
@@ -104,6 +162,12 @@ PLAYER_MAX_HEALTH = 320
 ENEMY_MAX_HEALTH = 80
 
 TITLE = 'Prince Of Persia'
+
+# When True only changed parts of the screen are redrawn and pushed to the display
+DIRTY_RENDERING = True
+# When True the menu sleeps until an event comes (at most MENU_IDLE_TIMEOUT ms) and redraws only on change
+MENU_EVENT_DRIVEN = True
+MENU_IDLE_TIMEOUT = 500
 FONT_PATH = None
 
 # Load images and sounds and font paths
@@ -148,20 +212,45 @@ SPECIAL_IMAGES = list(map(pygame.transform.scale,list(map(pygame.image.load,['re
 GAME_OVER_IMAGE = pygame.transform.scale(pygame.image.load('resources/images/menu/game_over_image.png'), (WIDTH, HEIGHT))
 SHOWING_TIME = 60
 
+# Images converted by convert_assets
+IMAGE_NAMES = ['MENU_BACKGROUND', 'INSTRUCTIONS_BACKGROUND', 'RESULTS_BACKGROUND', 'ICON', 'BRICK_IMAGE', 'PRESS_IMAGE',
+               'DOORS_IMAGE_CLOSE', 'DOORS_IMAGE_OPEN', 'SPIKES_IMAGE', 'EMPTY_IMAGE', 'GAME_BACKGROUND', 'GAME_OVER_IMAGE']
+SPRITESHEETS = [CHARACTER_SPRITESHEET, ENEMY_GREEN_SPRITESHEET, ENEMY_RED_SPRITESHEET, ENEMY_BLUE_SPRITESHEET,
+                ATTACK_SPRITESHEET, RED_POTION_SPRITESHEET, BLUE_POTION_SPRITESHEET, GREEN_POTION_SPRITESHEET,
+                YELLOW_POTION_SPRITESHEET, PURPLE_POTION_SPRITESHEET, ARROW_SPRITESHEET, BOSS_SPRITESHEET, SWORDS_SPRITESHEET]
+ASSET_STATS = {'converted': 0}
+
 
 MENU_MUSIC_PATH = "resources/sounds/Artur-Andrus-Cyniczne-córy-Zurychu (1) (mp3cut.net).mp3"
 GAME_MUSIC_PATH = "resources/sounds/theme.mp3"
-POTION_SOUND_PATH = "resources\\sounds\\potion.wav"
-GET_DAMAGE_SOUND_PATH = "resources\\sounds\\harm.wav"
-PLAYER_GET_DAMAGE_SOUND_PATH = "resources\\sounds\\guard-hit.wav"
-ATTACK_SOUND_PATH = "resources\\sounds\\sword_fight_1.wav"
+POTION_SOUND_PATH = os.path.join("resources", "sounds", "potion.wav")
+GET_DAMAGE_SOUND_PATH = os.path.join("resources", "sounds", "harm.wav")
+PLAYER_GET_DAMAGE_SOUND_PATH = os.path.join("resources", "sounds", "guard-hit.wav")
+ATTACK_SOUND_PATH = os.path.join("resources", "sounds", "sword_fight_1.wav")
 FONT_PATH = os.path.join(current_dir, 'resources', 'PoP.ttf')
+TEXT_CACHE = TextCache(FONT_PATH, 128)
+
+# Sound effects are decoded once and played on a pool of SOUND_VOICES channels
+SOUND_VOICES = 8
+SOUND_BANK = SoundBank(SOUND_VOICES)
+SOUND_BANK.register(ATTACK_SOUND_PATH, 0.15, polyphony = 3, priority = 0)
+SOUND_BANK.register(POTION_SOUND_PATH, 0.3, polyphony = 1, priority = 2)
+SOUND_BANK.register(GET_DAMAGE_SOUND_PATH, 0.2, polyphony = 2, priority = 1)
+SOUND_BANK.register(PLAYER_GET_DAMAGE_SOUND_PATH, 0.2, polyphony = 2, priority = 2)
 
 SCORES_FILE = "high_scores.json"
+SCORES_DATABASE = "high_scores.db"
+# 'sqlite' keeps every run in SCORES_DATABASE, 'json' keeps only the top results in SCORES_FILE
+SCORES_BACKEND = 'sqlite'
+SCORES_COUNT = 10
 
 # Levels configuration
 NEW_LEVEL_INDEX = [2, 4, 6]
 LAST_LEVEL_INDEX = 8
+# Moving objects are created only in chunks of CHUNK_SIZE x CHUNK_SIZE tiles
+# at most CHUNK_RADIUS chunks away from the player
+CHUNK_SIZE = 16
+CHUNK_RADIUS = 2
 
 level1 = [
     'BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB',
@@ -409,3 +498,8 @@ potions_positions = [[(21,7,PotionType.HEALTH)],
                      [(20,18,PotionType.NODAMAGE),(38,4,PotionType.SPEED),(21,9,PotionType.HEALTH),(15,14,PotionType.HEALTH)]]
 swords_positions = [[],[],[(22,23,1)],[],[(1,14,2)],[(1,14,3),(1,21,4)],[(10,21,5)],[]]
 
+# Levels are compiled to small binary files, compiled again when the tables above change
+LEVEL_CACHE_DIRECTORY = ".level_cache"
+LEVEL_CACHE = LevelCache(LEVEL_CACHE_DIRECTORY, levels, start_position, enemy_positions, boss_positions,
+                         potions_positions, swords_positions)
+
@@ -1,5 +1,6 @@
 import pygame
 from config import *
+from profiling import profiled
 import math
 import random
 
@@ -30,11 +31,11 @@ class Enemy(pygame.sprite.Sprite):
         self.right_animations = sprite_sheet.get_sprites(3, 66, self.width, self.height, 1, 3)
         
         self.image = self.right_animations[0]
-        self.image.set_colorkey(BLACK)
         self.rect = self.image.get_rect()
         self.rect.x = self.x
         self.rect.y = self.y
         
+    @profiled
     def update(self):
         self.movement()
         self.animate()
@@ -64,7 +65,7 @@ class Enemy(pygame.sprite.Sprite):
             self.x_change = 0
     
     def collide_blocks(self):
-        hits = pygame.sprite.spritecollide(self, self.game.collisions.sprites() + self.game.fakes.sprites(), False)
+        hits = self.game.tile_grid.collide(self, 'collisions', 'fakes')
         if hits:
             hit = hits[0]
             if self.x_change != 0:
@@ -144,9 +145,8 @@ class Boss(Enemy):
     
         self.rect = pygame.Rect(x * TILESIZE, (y + 1) * TILESIZE - self.height, self.width, self.height)
         self.right_animations = BOSS_SPRITESHEET.get_sprites(0, 7, self.width, self.height, 1, 3)
-        self.left_animations = [pygame.transform.flip(img, True, False) for img in self.right_animations]
+        self.left_animations = BOSS_SPRITESHEET.get_sprites(0, 7, self.width, self.height, 1, 3, flip = True)
         self.image = self.right_animations[0]
-        self.image.set_colorkey(BLACK)
 
         self.change_time = 0
         self.activate = False
@@ -157,7 +157,7 @@ class Boss(Enemy):
         return random.randint(8, 39)
 
     def magic_changes(self):
-        curr_time = pygame.time.get_ticks()
+        curr_time = self.game.virtual_clock.get_ticks()
         if curr_time > self.change_time + 5000:
             self.fix_magic_sequence()
             self.magic = self.random_version() % 4 + 1
@@ -191,7 +191,7 @@ class Boss(Enemy):
             self.kill()
  
     def cupids_arrow(self):
-        curr_time = pygame.time.get_ticks()
+        curr_time = self.game.virtual_clock.get_ticks()
         if abs(self.rect.x - self.game.player.rect.x) > 2 * TILESIZE:
             if curr_time >= self.arrow_time + 2000:
                 Arrow(self.game, self.rect.x, self.rect.y + 32, self.facing)
@@ -243,6 +243,7 @@ class Attack(pygame.sprite.Sprite):
         self.animate()
         self.collide()
         
+    @profiled
     def collide(self):
         target_group = self.game.enemies if self.reciever == 'enemy' else self.game.players
         hits = pygame.sprite.spritecollide(self, target_group, False)
@@ -273,11 +274,10 @@ class Arrow(pygame.sprite.Sprite):
         self.width = TILESIZE
         self.height = TILESIZE
 
-        self.image = ARROW_SPRITESHEET.get_sprite(0, 0, self.width + 2, self.height)
+        self.image = ARROW_SPRITESHEET.get_sprites(0, 0, self.width + 2, self.height, 1, 1, flip = self.direction != 'right')[0]
         if self.direction == 'right':
             self.x, self.y = x + TILESIZE, y
         else:
-            self.image = pygame.transform.flip(self.image, True, False)
             self.x, self.y = x - TILESIZE, y
 
         self.rect = self.image.get_rect(topleft=(self.x, self.y))
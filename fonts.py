@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import pygame
+
+class TextCache:
+    """Class for rendering text of the HUD and menus.
+    It keeps one Font per (path, size) and the last rendered text surfaces,
+    the least recently used surfaces are dropped when capacity is exceeded."""
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size, path = None):
+        path = path or self.path
+        font = self.fonts.get((path, size))
+        if font is None:
+            font = pygame.font.Font(path, size)
+            self.fonts[(path, size)] = font
+        return font
+
+    def render(self, text, size, color, path = None):
+        key = (text, size, tuple(color), path or self.path)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.font(size, path).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last = False)
+        return surface
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fonts': len(self.fonts),
+            'surfaces': len(self.surfaces),
+        }
@@ -4,18 +4,43 @@ from mapa import *
 from player import *
 from enemy import *
 from items import *
+from render import Renderer, Camera
+from levels import LevelLoader
+from timing import VirtualClock, FixedTimestep
+from inputs import KeyboardInput
+from overlay import PerformanceOverlay
+import random
 import sys
+import time
 
 class Game:
     """Class for the main game of the game.
     It creates map, set player and enemies, and handle the game loop.
-    Draw the everything on the screen and update the game state."""
-    def __init__(self):
+    Draw the everything on the screen and update the game state.
+    A headless game does not draw or play music and runs its steps as fast as it can,
+    input_source replaces the keyboard (see inputs). The random module is seeded with
+    seed and the virtual clock is the one of the current level, so a game can be replayed.
+    With preload_levels the next level is built in the background while playing.
+    level is the first level, an index of the level tables or a path of a level file."""
+    def __init__(self, headless = False, input_source = None, seed = None, preload_levels = True, level = 0):
+        self.headless = headless
+        self.preload_levels = preload_levels
+        self.input = input_source or KeyboardInput()
+        self.steps = 0
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        random.seed(self.seed)
 
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED if VSYNC else 0, vsync = int(VSYNC))
         pygame.display.set_caption(TITLE)
         pygame.display.set_icon(ICON)
         self.clock = pygame.time.Clock()
+        self.virtual_clock = VirtualClock(LEVEL_START_TICKS)
+        self.timestep = FixedTimestep(TICK_RATE, MAX_CATCH_UP_STEPS)
+        self.renderer = Renderer(self.screen, DIRTY_RENDERING)
+        self.camera = Camera(WIDTH, HEIGHT)
+        self.overlay = PerformanceOverlay(TEXT_CACHE.font(18), (8, 8), 1000 / (RENDER_FPS or TICK_RATE),
+                                          width = 400, lines = 7)
+        self.overlay.visible = PERFORMANCE_OVERLAY
         self.running = True
         
         self.character_spritesheet = CHARACTER_SPRITESHEET
@@ -28,101 +53,45 @@ class Game:
 
         self.results_screen = RESULTS_BACKGROUND
 
-        self.current_level_index = 0
+        self.current_level_index = level
         self.change_level = False
-        self.show_special_image_flag = True
+        self.show_special_image_flag = False
         self.special_image_start_time = 0
         self.game_over_flag = False
         self.new_record = False
 
         self.start_time = TIME
         self.time_left = self.start_time
-        play_music(GAME_MUSIC_PATH)
-
-    def createTilemap(self, level):
-        for i, row in enumerate(level):
-            for j, column in enumerate(row):
-                if column == "B":
-                    Block(self, j, i)
-                if column == "D":
-                    Door(self, j, i)
-                if column == "Y":
-                    FallingLeft(self, j, i)
-                if column == "R":
-                    FallingRight(self, j, i)
-                if column == "S":
-                    Spikes(self, j, i)  
-                if column == "H":
-                    SemiDoors(self, j, i)
-                if column == "P":
-                    Protection(self, j, i)
-                if column == "T":
-                    NewTrap(self, j, i)
-                if column == "L":
-                    Lift(self, j, i)
-                if column == "Z":
-                    FallingLeftBottomUp(self, j, i)
-                if column == "V":
-                    Fakes(self,j,i)
-                if column == "A":
-                    Gate(self, j, i)
-                if column == "C":
-                    MovingBlock(self, j, i)
+        self.timer_value = None
+        self.timer_text = None
+        self.level_time_left = self.start_time
+        self.splits = []
+        self.level_loader = LevelLoader(self.background)
+        self.transition_time = 0
+        if not headless:
+            play_music(GAME_MUSIC_PATH)
 
     def new(self, health_bar_size = 10 * TILESIZE, player_healt = PLAYER_MAX_HEALTH, sword_type = 0):
         self.playing = True
         
-        self.all_sprites = pygame.sprite.LayeredUpdates()
-        self.blocks = pygame.sprite.LayeredUpdates()
-        self.doors = pygame.sprite.LayeredUpdates()
-        self.fakes = pygame.sprite.LayeredUpdates()
-        self.semidoors = pygame.sprite.LayeredUpdates()
-        self.traps = pygame.sprite.LayeredUpdates()
-        self.spikes = pygame.sprite.LayeredUpdates()
-        self.protections = pygame.sprite.LayeredUpdates()
-        self.collisions = pygame.sprite.LayeredUpdates()
-        self.lift = pygame.sprite.LayeredUpdates()
-        self.upper_press = pygame.sprite.LayeredUpdates()
-        self.down_press = pygame.sprite.LayeredUpdates()
-        self.enemies = pygame.sprite.LayeredUpdates()
-        self.attack = pygame.sprite.LayeredUpdates()
-        self.players = pygame.sprite.LayeredUpdates()
-        self.potions = pygame.sprite.LayeredUpdates()
-        self.gate = pygame.sprite.LayeredUpdates()
-        self.arrows = pygame.sprite.LayeredUpdates()
-        self.swords = pygame.sprite.LayeredUpdates()
-        self.movingblocks = pygame.sprite.LayeredUpdates()
-
-        self.createTilemap(levels[self.current_level_index])
+        start = time.perf_counter()
+        self.level = self.level_loader.take(self.current_level_index)
+        self.level.install(self)
+        self.camera.set_bounds(*self.level.size)
+        self.renderer.invalidate()
+        if self.level.intro is not None:
+            self.current_special_image_index = self.level.intro
+            self.show_special_image_flag = True
         
-        start_x = start_position[self.current_level_index][0]
-        start_y = start_position[self.current_level_index][1]
+        start_x = self.level.start_position[0]
+        start_y = self.level.start_position[1]
         self.player = Player(self, start_x, start_y, player_healt, health_bar_size, sword_type)
         
-        for bosses in boss_positions[self.current_level_index]:
-            self.boss = Boss(self, bosses[0], bosses[1])
-
-        for enemy in enemy_positions[self.current_level_index]:
-            if enemy[2] == 'g': 
-                EnemyGreen(self, enemy[0], enemy[1])
-            elif enemy[2] == 'b':
-                EnemyBlue(self, enemy[0], enemy[1])
-            elif enemy[2] == 'r':
-                EnemyRed(self, enemy[0], enemy[1])
+        self.world.update(self.player.rect)
 
-        for potion in potions_positions[self.current_level_index]:
-            match potion[2]:
-                case PotionType.HEALTH:
-                    HealthPotion(self, potion[0], potion[1])
-                case PotionType.SPEED:
-                    SpeedPotion(self, potion[0], potion[1])
-                case PotionType.NOFALL:
-                    NoFallDamagePotion(self, potion[0], potion[1])
-                case PotionType.NODAMAGE:
-                    DamageResistancePotion(self, potion[0], potion[1])
-        
-        for sword in swords_positions[self.current_level_index]:
-            Sword(self, sword[0], sword[1], sword[2])
+        self.transition_time = (time.perf_counter() - start) * 1000
+        if self.preload_levels and self.level.next is not None:
+            self.level_loader.prepare(self.level.next)
 
     def events(self):
         """Handle the events of the game.
@@ -140,38 +109,86 @@ class Game:
                     self.player.get_health(32)
                 if event.key == pygame.K_ESCAPE: 
                     sys.exit()
+                if event.key == pygame.K_F3:
+                    self.overlay.toggle()
 
     def clock_update(self):
-        self.time_left -= self.clock.get_time()
+        self.time_left -= self.virtual_clock.elapsed
         if self.time_left <= 0:
             self.time_left = 0
   
     def update(self):
-        if not self.show_special_image_flag and not self.game_over_flag:
-            self.all_sprites.update()
-            self.clock_update()
-
-    def draw(self):
-        if self.game_over_flag:
+        if self.show_special_image_flag or self.game_over_flag:
             if self.special_image_start_time <= SHOWING_TIME:
-                self.screen.blit(self.game_over_image, (0, 0))
                 self.special_image_start_time += 1
-            else:
+            elif self.game_over_flag:
                 self.playing = False
-                
-        elif self.show_special_image_flag:
-            if self.special_image_start_time <= SHOWING_TIME:
-                image = self.special_images[self.current_special_image_index]
-                self.screen.blit(image, (0, 0))
-                self.special_image_start_time += 1
             else:
                 self.show_special_image_flag = False
                 self.special_image_start_time = 0
+        else:
+            self.world.update(self.player.rect)
+            self.broadphase.rebuild()
+            self.traps.update()
+            self.all_sprites.update()
+            self.clock_update()
+
+    def draw_timer(self, surface):
+        minutes, seconds = count_time(self.time_left)
+        if (minutes, seconds) != self.timer_value:
+            self.timer_value = (minutes, seconds)
+            self.timer_text = TEXT_CACHE.render(f"{minutes:02}:{seconds:02}", 30, WHITE)
+        text = self.timer_text
         
-        elif self.new_record:
-            font = pygame.font.Font(FONT_PATH, 36)
-            title_font = pygame.font.Font(FONT_PATH, 80)
+        text_width, text_height = text.get_size()
+        rect_width = text_width + 20  
+        rect_height = text_height + 5
+        rect_x = WIDTH // 2 - rect_width // 2
+        rect_y = 0
+
+        pygame.draw.rect(surface, BLACK, (rect_x, rect_y, rect_width, rect_height), 0, 5)
+        pygame.draw.rect(surface, YELLOW, (rect_x, rect_y, rect_width, rect_height), 2, 5)
+
+        surface.blit(text, (rect_x + 10, rect_y + 2.5))
+        return pygame.Rect(rect_x, rect_y, rect_width, rect_height)
 
+    def draw_hud(self, surface):
+        rects = [self.draw_timer(surface)]
+        if self.overlay.visible:
+            rects.append(self.overlay.draw(surface))
+        return rects
+
+    def performance_lines(self, times):
+        """Text of the performance overlay, times are the average ms of the parts of a frame."""
+        frame = sum(times.values())
+        groups = ' '.join(f"{name} {len(getattr(self, name))}" for name in ('enemies', 'attack', 'arrows', 'blocks', 'traps'))
+        sound = SOUND_BANK.stats()
+        caches = [('text', TEXT_CACHE), ('sound', SOUND_BANK), ('frames', FRAME_ATLAS), ('transforms', TRANSFORM_CACHE)]
+        rates = ' '.join(f"{name} {100 * cache.hits / max(1, cache.hits + cache.misses):.0f}%" for name, cache in caches)
+        return [
+            f"frame {frame:.1f} ms  {1000 / frame if frame else 0:.0f} fps  overlay {self.overlay.cost:.2f} ms",
+            ' '.join(f"{part} {ms:.1f}" for part, ms in times.items()),
+            f"sprites {len(self.all_sprites)}  drawn {len(self.camera.visible(self.all_sprites))}  "
+            f"pushed {self.renderer.pixels // 1000}k px",
+            groups,
+            f"voices {sound['busy_voices']}/{sound['voices']}  dropped {sound['dropped']}  "
+            f"sections {len(self.static_layer.sections)}/{self.static_layer.capacity}",
+            f"hits {rates}",
+            f"level built {self.level.build_time:.0f} ms  entered {self.transition_time:.1f} ms  "
+            f"converted {ASSET_STATS['converted']} images",
+        ]
+
+    def render(self):
+        """Draw the current state to the screen, return the dirty rects or None if all of it changed."""
+        dirty_rects = None
+        if self.game_over_flag:
+            self.screen.blit(self.game_over_image, (0, 0))
+                
+        elif self.show_special_image_flag:
+            image = self.special_images[self.current_special_image_index]
+            self.screen.blit(image, (0, 0))
+        
+        elif self.new_record:
             input_box = pygame.Rect(WIDTH//2 - 100, HEIGHT // 2, WIDTH // 2, 50)
             active = False
             text = ''
@@ -189,12 +206,9 @@ class Game:
                     if event.type == pygame.KEYDOWN:
                         if active:
                             if event.key == pygame.K_RETURN:
-                                scores = load_scores()
                                 minutes, seconds = count_time(self.time_left)
                                 result = str(minutes) + ':' + str(seconds)
-                                scores.append({"name": text, "time": result, "score": self.time_left})
-                                scores.sort(key=lambda x: x['score'], reverse=True)
-                                save_scores(scores[:10])
+                                add_score(text, result, self.time_left, self.splits)
                                 done = True
                             elif event.key == pygame.K_BACKSPACE:
                                 text = text[:-1]
@@ -204,14 +218,14 @@ class Game:
                 pygame.draw.rect(self.screen, GREY, pygame.Rect(60, 60, WIDTH-120, HEIGHT-164))
                 self.screen.blit(self.results_screen, (0, 0))
         
-                txt_surface = font.render(text, True, BLACK)
+                txt_surface = TEXT_CACHE.render(text, 36, BLACK)
                 width = max(200, txt_surface.get_width() + 10)
                 input_box.w = width
 
-                tekst = title_font.render("You win!!!", True, BLACK)
+                tekst = TEXT_CACHE.render("You win!!!", 80, BLACK)
                 self.screen.blit(tekst, (WIDTH // 2 - tekst.get_width() // 2, HEIGHT // 4))
                 
-                give_name_txt = font.render("Give your name below:", True, BLACK)
+                give_name_txt = TEXT_CACHE.render("Give your name below:", 36, BLACK)
                 self.screen.blit(give_name_txt, (WIDTH // 2 - give_name_txt.get_width() // 2, input_box.y - 40))
                 
                 pygame.draw.rect(self.screen, BLACK, input_box, 4, 6)
@@ -223,50 +237,77 @@ class Game:
                 self.playing = False
             
         else:
-            self.screen.blit(self.background, (0, 0))
-            self.all_sprites.draw(self.screen)
+            self.camera.follow(self.player)
+            dirty_rects = self.renderer.draw(self.static_layer, self.all_sprites, self.draw_hud, self.camera)
+        return dirty_rects
 
-            minutes, seconds = count_time(self.time_left)
-            time_text = f"{minutes:02}:{seconds:02}"
+    def draw(self):
+        dirty_rects = self.render()
+        self.overlay.lap('draw')
+        self.clock.tick(RENDER_FPS)
+        self.overlay.lap('tick')
+        if dirty_rects is None:
+            self.renderer.invalidate()
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
+        self.overlay.lap('draw')
+        self.overlay.end_frame(self.performance_lines)
 
-            font = pygame.font.Font(FONT_PATH, 30)
-            text = font.render(time_text, True, WHITE)
+    def step(self):
+        """One step of the simulation, TICK_RATE steps make a second of the game."""
+        self.steps += 1
+        self.input.next_step()
+        self.virtual_clock.advance(self.timestep.step_time)
+        if self.player.current_health <= 0 or self.time_left <= 0:
+            self.game_over_flag = True
             
-            text_width, text_height = text.get_size()
-            rect_width = text_width + 20  
-            rect_height = text_height + 5
-            rect_x = WIDTH // 2 - rect_width // 2
-            rect_y = 0
+        elif self.change_level and not self.new_record:
+            self.splits.append(self.level_time_left - self.time_left)
+            self.level_time_left = self.time_left
 
-            pygame.draw.rect(self.screen, BLACK, (rect_x, rect_y, rect_width, rect_height), 0, 5)
-            pygame.draw.rect(self.screen, YELLOW, (rect_x, rect_y, rect_width, rect_height), 2, 5)
+            if self.level.next is None:
+                self.new_record = True
 
-            self.screen.blit(text, (rect_x + 10, rect_y + 2.5))
-        
-        self.clock.tick(FPS)
-        pygame.display.update()
+            else:
+                self.current_level_index = self.level.next
+                self.new(player_healt = self.player.current_health, health_bar_size = self.player.health_bar.x, sword_type = self.player.sword_type)
+                self.change_level = False
+                self.timestep.reset()
+
+        self.update()
 
     def main(self):
+        """Game loop: every frame handles events, runs the simulation steps due since the
+        last frame and draws the current state once."""
+        if self.headless:
+            self.run_headless()
+            return
+
+        self.timestep.reset()
         while self.playing:
+            self.overlay.begin()
             self.events()
-            if self.player.current_health <= 0 or self.time_left <= 0:
-                self.game_over_flag = True
-                
-            elif self.change_level and self.current_level_index != LAST_LEVEL_INDEX:
-                self.current_level_index += 1
-
-                if self.current_level_index in NEW_LEVEL_INDEX:
-                    self.current_special_image_index += 1
-                    self.show_special_image_flag = True
-
-                if self.current_level_index == LAST_LEVEL_INDEX:
-                    self.new_record = True
+            self.overlay.lap('events')
+            for _ in range(self.timestep.steps()):
+                if not self.playing or self.new_record:
+                    break
+                self.step()
+            self.overlay.lap('update')
+            self.draw()
 
-                else:
-                    self.new(player_healt = self.player.current_health, health_bar_size = self.player.health_bar.x, sword_type = self.player.sword_type)
-                    self.change_level = False
+        self.level_loader.shutdown()
+        self.running = False
 
-            self.update()
-            self.draw()
+    def run_headless(self, max_steps = None):
+        """Run steps without drawing until the game ends or max_steps are done.
+        The game ends at the new record screen, nothing is saved."""
+        while self.playing and (max_steps is None or self.steps < max_steps):
+            self.events()
+            self.step()
+            if self.new_record:
+                self.playing = False
 
-        self.running = False
\ No newline at end of file
+        if not self.playing:
+            self.level_loader.shutdown()
+            self.running = False
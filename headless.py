@@ -0,0 +1,58 @@
+"""Headless run of the game: no window, no sound, no frame limit.
+Run from the repository directory, e.g. python headless.py --steps 18000"""
+import argparse
+import os
+import time
+import pygame
+import config
+from levelfile import parse_level
+
+# A simple walk through the level: run right, jump now and then, attack and go through doors
+DEMO_SCRIPT = [
+    (30, (pygame.K_RIGHT,)),
+    (8, (pygame.K_RIGHT, pygame.K_UP)),
+    (20, (pygame.K_RIGHT, pygame.K_SPACE)),
+    (4, (pygame.K_DOWN,)),
+    (30, (pygame.K_LEFT,)),
+    (8, (pygame.K_LEFT, pygame.K_UP)),
+    (4, (pygame.K_DOWN,)),
+]
+
+def init_headless():
+    """Initialize the display with the dummy video driver and fonts and convert the assets.
+    The mixer is not started, so no sound is played. SDL does not take over SIGINT and
+    SIGTERM, so a headless process can be stopped like any other.
+    It has to be called before importing the modules of the game, like in main.py."""
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode((config.WIDTH, config.HEIGHT))
+    config.convert_assets()
+
+def new_game(input_source, level = 0, seed = None, preload_levels = True):
+    """Return a headless game started on the given level.
+    Without preload_levels the next level is not built in the background."""
+    from game import Game
+    game = Game(headless = True, input_source = input_source, seed = seed, preload_levels = preload_levels, level = level)
+    game.new()
+    return game
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--steps', type=int, default=config.TIME * config.TICK_RATE // 1000)
+    parser.add_argument('--level', type=parse_level, default=0, help="index of the level tables or a level file")
+    args = parser.parse_args()
+
+    init_headless()
+    from inputs import ScriptedInput
+    game = new_game(ScriptedInput(DEMO_SCRIPT, loop = True), args.level)
+    start = time.perf_counter()
+    game.run_headless(args.steps)
+    elapsed = time.perf_counter() - start
+
+    print(f"{game.steps} steps in {elapsed:.2f} s, {game.steps / elapsed:.0f} steps/s, "
+          f"{game.steps / config.TICK_RATE / elapsed:.0f}x realtime")
+    print(f"level {game.current_level_index}, health {game.player.current_health}, time left {game.time_left} ms")
+    game.level_loader.shutdown()
+    pygame.quit()
@@ -0,0 +1,64 @@
+import random
+import pygame
+
+class PressedKeys:
+    """Pressed keys which can be indexed by key constants like pygame.key.get_pressed()."""
+    def __init__(self, keys = ()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+class KeyboardInput:
+    """Input read from the keyboard."""
+    def next_step(self):
+        pass
+
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+class ScriptedInput:
+    """Input given by a script, a list of (steps, keys) pairs: keys are held for that many
+    steps of the simulation. After the end of the script nothing is pressed, or the
+    script starts again if loop is set."""
+    def __init__(self, script, loop = False):
+        self.script = [(steps, PressedKeys(keys)) for steps, keys in script]
+        self.loop = loop
+        self.index = 0
+        self.left = 0
+        self.pressed = PressedKeys()
+
+    def next_step(self):
+        while self.left == 0:
+            if self.index == len(self.script):
+                if not self.loop or not self.script:
+                    self.pressed = PressedKeys()
+                    return
+                self.index = 0
+            self.left, self.pressed = self.script[self.index]
+            self.index += 1
+        self.left -= 1
+
+    def get_pressed(self):
+        return self.pressed
+
+class RandomInput:
+    """Input of a random player: every choice of keys from choices is held for
+    hold_min to hold_max steps. It has its own generator, so it does not change
+    the random numbers the game uses."""
+    def __init__(self, seed, choices, hold_min = 5, hold_max = 40):
+        self.random = random.Random(seed)
+        self.choices = [PressedKeys(keys) for keys in choices]
+        self.hold_min = hold_min
+        self.hold_max = hold_max
+        self.left = 0
+        self.pressed = PressedKeys()
+
+    def next_step(self):
+        if self.left == 0:
+            self.pressed = self.random.choice(self.choices)
+            self.left = self.random.randint(self.hold_min, self.hold_max)
+        self.left -= 1
+
+    def get_pressed(self):
+        return self.pressed
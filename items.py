@@ -19,11 +19,8 @@ class Potion(pygame.sprite.Sprite):
         self.animation_loop = 0
         self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
         
-        self.animations = sprite_sheet.get_sprites(0, 0, self.width, self.height, 3, 2)
+        self.animations = TRANSFORM_CACHE.get(sprite_sheet.get_sprites(0, 0, self.width, self.height, 3, 2), size = (22, 22))
         self.image = self.animations[0]
-        self.image.set_colorkey(BLACK)
-        self.rect = self.image.get_rect()
-        self.rect.x = self.x
         self.rect.y = self.y + 10
         self.influence_action = influence_action
     
@@ -32,7 +29,6 @@ class Potion(pygame.sprite.Sprite):
     
     def animate(self):
         self.image = self.animations[math.floor(self.animation_loop)]
-        self.image = pygame.transform.scale(self.image, (22, 22))
         self.animation_loop += 0.2
         if self.animation_loop >= 6:
             self.animation_loop = 1
@@ -96,13 +92,12 @@ class Sword(pygame.sprite.Sprite):
         
         if typ in self.SWORD_TYPES:
             sprite_x, damage_mult = self.SWORD_TYPES[typ]
-            self.image = SWORDS_SPRITESHEET.get_sprite(sprite_x, 0, self.width, self.height)
+            self.image = SWORDS_SPRITESHEET.get_sprites(sprite_x, 0, self.width, self.height, 1, 1)[0]
             self.attack = PLAYER_DEFAULT_DAMAGE * damage_mult
         else:
             self.kill()
             return
             
-        self.image.set_colorkey(BLACK)
         self.rect = self.image.get_rect()
         self.rect.x = self.x
         self.rect.y = self.y
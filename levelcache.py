@@ -0,0 +1,191 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from spatial import TileMerger
+from levelfile import LevelFile
+
+LEVEL_MAGIC = b'POPL'
+LEVEL_FORMAT_VERSION = 2
+# magic, format version, columns, rows, digest of the source, start position,
+# intro image and next level (NO_LEVEL if not given),
+# counts of objects, colliders, enemies, bosses, potions and swords
+HEADER = struct.Struct('<4sHHH20sHHHH6I')
+NO_LEVEL = 0xFFFF
+# tile code, column, row of a tile which becomes a sprite
+OBJECT = struct.Struct('<cHH')
+# column, row, width and height in tiles of merged bricks
+RECT = struct.Struct('<4H')
+# column, row, kind (enemy colour, potion type or sword type)
+SPAWN = struct.Struct('<HHB')
+
+OBJECT_CODES = re.compile('[^.B]')
+
+class LevelTables:
+    """Level given by the tables in config, the same fields as levelfile.LevelFile has.
+    Transitions of these levels are given by config.level_transitions, so intro and next are None."""
+    def __init__(self, tilemap, start, enemies, bosses, potions, swords):
+        self.rows = len(tilemap)
+        self.columns = max(len(row) for row in tilemap)
+        self.start_position = start
+        self.enemy_positions = enemies
+        self.boss_positions = bosses
+        self.potions_positions = [(x, y, getattr(kind, 'value', kind)) for x, y, kind in potions]
+        self.swords_positions = swords
+        self.intro = None
+        self.next = None
+        self.tile_rows = tilemap
+
+    def tilemap(self):
+        return iter(self.tile_rows)
+
+    def digest(self):
+        """Digest of the level tables, stored in the compiled file to notice that the source has changed."""
+        source = repr((list(self.tile_rows), tuple(self.start_position), self.enemy_positions,
+                       self.boss_positions, self.potions_positions, self.swords_positions))
+        return hashlib.sha1(source.encode()).digest()
+
+def write_level(file, source, digest):
+    """Write the level compiled from source to a binary file: header, tile codes row by row,
+    then the tiles which become sprites (in reading order), the merged bricks and the spawns.
+    Rows of the source are read one at a time."""
+    file.write(bytes(HEADER.size))
+    objects = []
+    merger = TileMerger('B')
+    for i, row in enumerate(source.tilemap()):
+        row = row.ljust(source.columns, '.')
+        file.write(row.encode('ascii'))
+        objects += [(code.group().encode('ascii'), code.start(), i) for code in OBJECT_CODES.finditer(row)]
+        merger.add_row(row)
+
+    enemies, bosses = source.enemy_positions, source.boss_positions
+    potions, swords = source.potions_positions, source.swords_positions
+    for item in objects:
+        file.write(OBJECT.pack(*item))
+    for rect in merger.rects:
+        file.write(RECT.pack(*rect))
+    for x, y, kind in enemies:
+        file.write(SPAWN.pack(x, y, ord(kind)))
+    for x, y in bosses:
+        file.write(SPAWN.pack(x, y, 0))
+    for spawn in potions + swords:
+        file.write(SPAWN.pack(*spawn))
+
+    file.seek(0)
+    file.write(HEADER.pack(LEVEL_MAGIC, LEVEL_FORMAT_VERSION, source.columns, source.rows, digest,
+                           source.start_position[0], source.start_position[1],
+                           NO_LEVEL if source.intro is None else source.intro,
+                           NO_LEVEL if source.next is None else source.next, len(objects), len(merger.rects),
+                           len(enemies), len(bosses), len(potions), len(swords)))
+
+class CompiledLevel:
+    """Level read from the compiled file. The file is memory mapped and tile codes
+    are read from the mapping only when asked for, the short lists of objects,
+    merged bricks and spawns are unpacked at once."""
+    def __init__(self, buffer):
+        self.buffer = buffer
+        (magic, version, self.columns, self.rows, self.digest, start_x, start_y, intro, following,
+         objects, colliders, enemies, bosses, potions, swords) = HEADER.unpack_from(buffer, 0)
+        if magic != LEVEL_MAGIC or version != LEVEL_FORMAT_VERSION:
+            raise ValueError("Not a compiled level of this version")
+        self.start_position = (start_x, start_y)
+        self.intro = None if intro == NO_LEVEL else intro
+        self.next = None if following == NO_LEVEL else following
+
+        offset = HEADER.size
+        self.tiles = memoryview(buffer)[offset:offset + self.columns * self.rows]
+        offset += self.columns * self.rows
+        self.objects = [(code.decode('ascii'), x, y) for code, x, y in self.unpack(OBJECT, offset, objects)]
+        offset += OBJECT.size * objects
+        self.colliders = self.unpack(RECT, offset, colliders)
+        offset += RECT.size * colliders
+
+        spawns = self.unpack(SPAWN, offset, enemies + bosses + potions + swords)
+        self.enemy_positions = [(x, y, chr(kind)) for x, y, kind in spawns[:enemies]]
+        del spawns[:enemies]
+        self.boss_positions = [(x, y) for x, y, _ in spawns[:bosses]]
+        del spawns[:bosses]
+        self.potions_positions = spawns[:potions]
+        self.swords_positions = spawns[potions:potions + swords]
+
+    def unpack(self, record, offset, count):
+        return list(record.iter_unpack(self.buffer[offset:offset + record.size * count]))
+
+    def row(self, index):
+        start = index * self.columns
+        return bytes(self.tiles[start:start + self.columns]).decode('ascii')
+
+    def tilemap(self):
+        return [self.row(index) for index in range(self.rows)]
+
+class LevelCache:
+    """Compiled levels kept on disk in directory, one small file per level.
+    A level is compiled on the first load and again whenever the digest stored
+    in its file does not match the source, then it is only mapped and unpacked.
+    Loaded levels are kept in memory."""
+    def __init__(self, directory, levels, start_position, enemy_positions, boss_positions, potions_positions, swords_positions):
+        self.directory = directory
+        self.levels = levels
+        self.start_position = start_position
+        self.enemy_positions = enemy_positions
+        self.boss_positions = boss_positions
+        self.potions_positions = potions_positions
+        self.swords_positions = swords_positions
+        self.loaded = {}
+        self.compiled = 0
+        self.lock = threading.Lock()
+
+    def path(self, level):
+        if isinstance(level, str):
+            name = hashlib.sha1(os.path.abspath(level).encode()).hexdigest()[:12]
+            return os.path.join(self.directory, f"file-{name}.bin")
+        return os.path.join(self.directory, f"level{level}.bin")
+
+    def source(self, level):
+        if isinstance(level, str):
+            return LevelFile(level)
+        return LevelTables(self.levels[level], self.start_position[level], self.enemy_positions[level],
+                           self.boss_positions[level], self.potions_positions[level], self.swords_positions[level])
+
+    def load(self, level):
+        """Return the compiled level, level is an index of the level tables or a path of a level file.
+        It is compiled first if its compiled file is missing or stale."""
+        with self.lock:
+            compiled = self.loaded.get(level)
+            if compiled is None:
+                source = self.source(level)
+                digest = source.digest()
+                compiled = self.read(level, digest)
+                if compiled is None:
+                    self.write(level, source, digest)
+                    compiled = self.read(level, digest)
+                self.loaded[level] = compiled
+            return compiled
+
+    def read(self, level, digest):
+        """Return the level mapped from its compiled file, or None if the file is missing or stale."""
+        try:
+            with open(self.path(level), 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            compiled = CompiledLevel(buffer)
+        except (ValueError, struct.error):
+            return None
+        return compiled if compiled.digest == digest else None
+
+    def write(self, level, source, digest):
+        """Compile the level to a temporary file and rename it over the old one."""
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=self.directory, suffix='.tmp', delete=False) as file:
+            try:
+                write_level(file, source, digest)
+            except (ValueError, struct.error):
+                os.remove(file.name)
+                raise
+        os.replace(file.name, self.path(level))
+        self.compiled += 1
@@ -0,0 +1,204 @@
+"""Text files with one level each, e.g.
+
+    # comment
+    size 40 25
+    start 1 21
+    enemy 9 13 g
+    boss 12 21
+    potion 21 7 HEALTH
+    sword 22 23 1
+    intro 1
+    next 1
+    tiles
+    BBBBBBBB...
+
+Positions are in tiles. intro is the special image shown before the level, next is
+the number of the following level or 'end', level N is the file levelN.lvl in the
+same directory. The tile rows follow the tiles line and are read one at a time, so
+a map of any size is never held in memory at once.
+Run python levelfile.py export <directory> to export the levels from config."""
+import hashlib
+import os
+import re
+import sys
+
+ENEMY_CODES = 'gbr'
+# Names and values of config.PotionType
+POTION_CODES = {'HEALTH': 1, 'SPEED': 2, 'NOFALL': 3, 'NODAMAGE': 4}
+# Empty space and bricks, the other tile codes are the classes of levels.Level
+BASE_TILE_CODES = '.B'
+LEVEL_FILE_EXTENSION = '.lvl'
+# Values of every header line
+LINE_FIELDS = {
+    'size': ('number', 'number'),
+    'start': ('number', 'number'),
+    'enemy': ('number', 'number', 'enemy'),
+    'boss': ('number', 'number'),
+    'potion': ('number', 'number', 'potion'),
+    'sword': ('number', 'number', 'number'),
+    'intro': ('number',),
+    'next': ('level',),
+}
+
+def level_file_path(path, number):
+    """Path of the level file with the given number next to the level file path."""
+    return os.path.join(os.path.dirname(path), f"level{number}{LEVEL_FILE_EXTENSION}")
+
+def parse_level(text):
+    """Level given on the command line: an index of the level tables or a path of a level file."""
+    return int(text) if text.isdigit() else text
+
+def tile_codes():
+    """Return the tile codes understood by Level.createTilemap.
+    levels is imported only here, it needs config which imports this module."""
+    from levels import Level
+    return BASE_TILE_CODES + ''.join(Level.TILE_CLASSES) + ''.join(Level.OBJECT_CLASSES)
+
+class LevelFile:
+    """Level file with its header parsed, tile rows are read by tilemap()."""
+    def __init__(self, path):
+        self.path = path
+        self.columns = self.rows = None
+        self.start_position = None
+        self.enemy_positions = []
+        self.boss_positions = []
+        self.potions_positions = []
+        self.swords_positions = []
+        self.intro = None
+        self.next = None
+        self.tiles_offset = None
+        self.tiles_line = 0
+
+        with open(path, 'rb') as file:
+            while self.tiles_offset is None:
+                line = file.readline()
+                if not line:
+                    raise self.error("missing tiles")
+                self.tiles_line += 1
+                self.parse(line.decode('ascii').split())
+                if self.tiles_offset is not None:
+                    self.tiles_offset = file.tell()
+
+        if self.columns is None:
+            raise self.error("missing size")
+        if self.start_position is None:
+            raise self.error("missing start")
+
+    def error(self, message, line = None):
+        return ValueError(f"{self.path}:{line or self.tiles_line}: {message}")
+
+    def parse(self, words):
+        if not words or words[0].startswith('#'):
+            return
+        key, values = words[0], words[1:]
+        if key == 'tiles' and not values:
+            self.tiles_offset = 0
+            return
+        if key not in LINE_FIELDS:
+            raise self.error(f"unknown line '{' '.join(words)}'")
+        fields = LINE_FIELDS[key]
+        if len(values) != len(fields):
+            raise self.error(f"'{key}' needs {len(fields)} values")
+        values = [self.value(field, value) for field, value in zip(fields, values)]
+
+        if key == 'size':
+            self.columns, self.rows = values
+        elif key == 'start':
+            self.start_position = tuple(values)
+        elif key == 'enemy':
+            self.enemy_positions.append(tuple(values))
+        elif key == 'boss':
+            self.boss_positions.append(tuple(values))
+        elif key == 'potion':
+            self.potions_positions.append(tuple(values))
+        elif key == 'sword':
+            self.swords_positions.append(tuple(values))
+        elif key == 'intro':
+            self.intro, = values
+        elif key == 'next':
+            self.next, = values
+
+    def value(self, field, text):
+        if field == 'enemy':
+            if text not in ENEMY_CODES:
+                raise self.error(f"unknown enemy '{text}'")
+            return text
+        if field == 'potion':
+            if text not in POTION_CODES:
+                raise self.error(f"unknown potion '{text}'")
+            return POTION_CODES[text]
+        if field == 'level' and text == 'end':
+            return None
+        if not text.isdigit():
+            raise self.error(f"'{text}' is not a number")
+        return int(text)
+
+    def tilemap(self):
+        """Yield the tile rows one by one, checking their width and tile codes."""
+        invalid = re.compile(f"[^{re.escape(tile_codes())}]")
+        with open(self.path, 'rb') as file:
+            file.seek(self.tiles_offset)
+            for index in range(self.rows):
+                line_number = self.tiles_line + index + 1
+                row = file.readline().decode('ascii').rstrip('\r\n')
+                if len(row) != self.columns:
+                    raise self.error(f"row has {len(row)} tiles instead of {self.columns}", line_number)
+                code = invalid.search(row)
+                if code:
+                    raise self.error(f"unknown tile code '{code.group()}' in column {code.start()}", line_number)
+                yield row
+            if file.read().strip():
+                raise self.error(f"more than {self.rows} rows", self.tiles_line + self.rows + 1)
+
+    def digest(self):
+        """Digest of the file content, read in blocks."""
+        digest = hashlib.sha1()
+        with open(self.path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 16), b''):
+                digest.update(block)
+        return digest.digest()
+
+def write_level_file(path, tilemap, start, enemies, bosses, potions, swords, intro = None, next = None):
+    """Write a level, potions are (x, y, name of the potion type)."""
+    tilemap = list(tilemap)
+    lines = [f"size {max(len(row) for row in tilemap)} {len(tilemap)}", f"start {start[0]} {start[1]}"]
+    lines += [f"enemy {x} {y} {kind}" for x, y, kind in enemies]
+    lines += [f"boss {x} {y}" for x, y in bosses]
+    lines += [f"potion {x} {y} {kind}" for x, y, kind in potions]
+    lines += [f"sword {x} {y} {kind}" for x, y, kind in swords]
+    if intro is not None:
+        lines.append(f"intro {intro}")
+    lines.append(f"next {'end' if next is None else next}")
+    lines.append("tiles")
+    with open(path, 'w', newline='\n') as file:
+        file.write('\n'.join(lines) + '\n')
+        for row in tilemap:
+            file.write(row + '\n')
+
+def export_levels(directory):
+    """Export the levels from the config tables to directory, one file per level."""
+    import config
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, tilemap in enumerate(config.levels):
+        intro, following = config.level_transitions(index)
+        path = os.path.join(directory, f"level{index}{LEVEL_FILE_EXTENSION}")
+        write_level_file(path, tilemap, config.start_position[index], config.enemy_positions[index],
+                         config.boss_positions[index],
+                         [(x, y, kind.name) for x, y, kind in config.potions_positions[index]],
+                         config.swords_positions[index], intro, following)
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'export':
+        for path in export_levels(sys.argv[2]):
+            print(path)
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'check':
+        for path in sys.argv[2:]:
+            level = LevelFile(path)
+            for _ in level.tilemap():
+                pass
+            print(f"{path}: {level.columns}x{level.rows} ok")
+    else:
+        print("usage: python levelfile.py export <directory> | check <file>...")
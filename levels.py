@@ -0,0 +1,144 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from config import *
+from profiling import profiled
+from mapa import *
+from enemy import *
+from items import *
+from render import StaticLayer, Camera
+from spatial import TileGrid, Broadphase, Collider
+from world import ChunkWorld
+from timing import VirtualClock
+from levelfile import level_file_path
+
+class Level:
+    """Class for one level of the game: its sprite groups, tiles and spawn lists.
+    A level is built without touching the running game, so it can be prepared on
+    a worker thread. Then install makes it the current level of the game.
+    index is an index of the level tables in config or a path of a level file (see levelfile)."""
+    GROUPS = ('all_sprites', 'tiles', 'blocks', 'doors', 'fakes', 'semidoors', 'traps', 'spikes', 'protections',
+              'collisions', 'lift', 'upper_press', 'down_press', 'enemies', 'attack', 'players', 'potions', 'gate',
+              'arrows', 'swords', 'movingblocks')
+    # Bricks ("B") are not sprites, they are merged into colliders when the level is compiled
+    # and drawn by the static layer.
+    TILE_CLASSES = {"H": SemiDoors, "P": Protection, "T": NewTrap, "V": Fakes, "A": Gate}
+    # Moving and animated tiles and the spawns are created by the chunk world of the game.
+    OBJECT_CLASSES = {"D": Door, "Y": FallingLeft, "R": FallingRight, "S": Spikes, "L": Lift,
+                      "Z": FallingLeftBottomUp, "C": MovingBlock}
+    ENEMY_CLASSES = {'g': EnemyGreen, 'b': EnemyBlue, 'r': EnemyRed}
+    POTION_CLASSES = {PotionType.HEALTH: HealthPotion, PotionType.SPEED: SpeedPotion,
+                      PotionType.NOFALL: NoFallDamagePotion, PotionType.NODAMAGE: DamageResistancePotion}
+
+    def __init__(self, index, background):
+        self.index = index
+        self.background = background
+        self.tilemap = LEVEL_CACHE.load(index)
+        self.start_position = self.tilemap.start_position
+        self.enemy_positions = self.tilemap.enemy_positions
+        self.boss_positions = self.tilemap.boss_positions
+        self.potions_positions = [(x, y, PotionType(kind)) for x, y, kind in self.tilemap.potions_positions]
+        self.swords_positions = self.tilemap.swords_positions
+        # Special image shown before the level and the next level (an index or a path),
+        # None when there is no image or this is the last level
+        if isinstance(index, str):
+            self.intro = self.tilemap.intro
+            self.next = None if self.tilemap.next is None else level_file_path(index, self.tilemap.next)
+        else:
+            self.intro, self.next = level_transitions(index)
+        self.build_time = 0
+        self.virtual_clock = VirtualClock(LEVEL_START_TICKS)
+
+        for name in self.GROUPS:
+            setattr(self, name, pygame.sprite.LayeredUpdates())
+
+    def build(self):
+        """Create the level, composite the static layer under the start view and create
+        the objects of the chunks around the start, so install has nothing left to do.
+        The level has its own virtual clock, which stands still until the game advances it."""
+        start = time.perf_counter()
+        self.createTilemap(self.tilemap)
+        x, y = self.start_position
+        self.start_rect = pygame.Rect(x * TILESIZE, y * TILESIZE, TILESIZE, TILESIZE)
+        camera = Camera(WIDTH, HEIGHT)
+        camera.set_bounds(*self.size)
+        camera.center(self.start_rect)
+        self.static_layer.prepare(camera.rect)
+        self.world = ChunkWorld(self, self.objects, TILESIZE, CHUNK_SIZE, CHUNK_RADIUS)
+        self.world.update(self.start_rect)
+        self.build_time = (time.perf_counter() - start) * 1000
+        return self
+
+    @profiled
+    def createTilemap(self, level):
+        """Create static sprites and colliders of the compiled level (see levelcache) and the
+        list of objects for the chunk world."""
+        self.objects = []
+        for column, j, i in level.objects:
+            if column in self.TILE_CLASSES:
+                self.TILE_CLASSES[column](self, j, i).tile_index = (i, j)
+            elif column in self.OBJECT_CLASSES:
+                self.objects.append((self.OBJECT_CLASSES[column], (j, i)))
+        self.objects += [(Boss, (x, y)) for x, y in self.boss_positions]
+        self.objects += [(self.ENEMY_CLASSES[kind], (x, y)) for x, y, kind in self.enemy_positions]
+        self.objects += [(self.POTION_CLASSES[kind], (x, y)) for x, y, kind in self.potions_positions]
+        self.objects += [(Sword, (x, y, kind)) for x, y, kind in self.swords_positions]
+
+        self.colliders = [Collider(x, y, columns, rows, TILESIZE) for x, y, columns, rows in level.colliders]
+        self.size = (level.columns * TILESIZE, level.rows * TILESIZE)
+        fills = [(BRICK_IMAGE, collider.rect) for collider in self.colliders]
+        self.static_layer = StaticLayer(self.background, self.tiles, fills, self.size)
+
+        self.tile_grid = TileGrid(level.columns, level.rows, TILESIZE)
+        self.tile_grid.add_colliders(self.colliders)
+        self.tile_grid.add('collisions', self.collisions, self.tiles, solid = True)
+        self.tile_grid.add('blocks', self.blocks, self.tiles, solid = True)
+        self.tile_grid.add('protections', self.protections, self.tiles)
+        self.tile_grid.add('fakes', self.fakes, self.tiles)
+        self.tile_grid.add('traps', self.traps, self.tiles)
+
+        self.broadphase = Broadphase(self.tiles.sprites() + self.colliders, self.all_sprites, 4 * TILESIZE, TILESIZE)
+
+    def install(self, game):
+        """Hand the groups and prepared data over to the game."""
+        for name in self.GROUPS:
+            setattr(game, name, getattr(self, name))
+        game.static_layer = self.static_layer
+        game.tile_grid = self.tile_grid
+        game.broadphase = self.broadphase
+        game.world = self.world
+        game.virtual_clock = self.virtual_clock
+        self.world.game = game
+
+        for sprite in self.tiles:
+            sprite.game = game
+        for sprite in self.all_sprites:
+            sprite.game = game
+
+class LevelLoader:
+    """Builds levels on a background worker thread, so entering the next level
+    only takes the already built one."""
+    def __init__(self, background):
+        self.background = background
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.pending = {}
+
+    def prepare(self, index):
+        """Start building the level, index is an index of the level tables or a path of a level file."""
+        if index not in self.pending:
+            self.pending[index] = self.executor.submit(self.build, index)
+
+    def build(self, index):
+        """Load (compiling it if needed) and build the level, on the worker thread when prepared."""
+        return Level(index, self.background).build()
+
+    def take(self, index):
+        """Return the built level, building it now if it was not prepared."""
+        future = self.pending.pop(index, None)
+        if future is None:
+            return self.build(index)
+        return future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait = False, cancel_futures = True)
+        self.pending = {}
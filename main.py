@@ -1,7 +1,18 @@
+import sys
+import pygame
+import config
+from levelfile import parse_level
+
+# Assets are converted before the other modules import them from config
+pygame.init()
+pygame.display.set_mode((config.WIDTH, config.HEIGHT))
+config.convert_assets()
+
 from menu import *
 
 if __name__ == '__main__':
-    m = Menu()
+    # python main.py [index of the level tables or a level file]
+    m = Menu(parse_level(sys.argv[1]) if len(sys.argv) > 1 else 0)
     try:
         m.run()
     finally:
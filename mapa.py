@@ -1,4 +1,5 @@
 from config import *
+from profiling import profiled
 import pygame
 import math
 
@@ -7,7 +8,7 @@ class Block(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
         self.game = game
         self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.blocks, self.game.collisions
+        self.groups = self.game.tiles, self.game.blocks, self.game.collisions
         pygame.sprite.Sprite.__init__(self, self.groups)
 
         self.x = x * TILESIZE
@@ -38,6 +39,7 @@ class MovingBlock(Block):
         self.fall_speed = FALL_SPEED // 2
 
         self.groups = self.game.all_sprites, self.game.blocks, self.game.collisions, self.game.movingblocks
+        self.remove(self.game.tiles)
         pygame.sprite.Sprite.__init__(self, self.groups)
 
     def update(self):
@@ -59,7 +61,7 @@ class Gate(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
         self.game = game
         self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.gate, self.game.collisions
+        self.groups = self.game.tiles, self.game.gate, self.game.collisions
         pygame.sprite.Sprite.__init__(self, self.groups)
 
         self.x = x * TILESIZE
@@ -71,6 +73,11 @@ class Gate(pygame.sprite.Sprite):
 
         self.rect = self.image.get_rect()
         self.rect.topleft = (self.x, self.y)
+
+    def kill(self):
+        self.game.static_layer.remove(self)
+        self.game.tile_grid.remove(self)
+        super().kill()
         
 class Door(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
@@ -128,7 +135,7 @@ class FallingLeft(pygame.sprite.Sprite):
         self.rect.topleft = (self.x, self.y)
 
         self.collided = False
-        self.next_image_time = pygame.time.get_ticks()
+        self.next_image_time = self.game.virtual_clock.get_ticks()
         self.fall_speed = 0
         self.last_change_time = 0
         self.damage = True
@@ -140,22 +147,19 @@ class FallingLeft(pygame.sprite.Sprite):
         if (player_y > self.rect.y + 2 * TILESIZE) and (player_x + 2 * TILESIZE > self.rect.x):
             self.fall_speed = FALL_SPEED // 2
 
+    @profiled
     def update(self):
         self.activate()
 
         if not self.collided:
             self.rect.y += self.fall_speed
 
-        collisions = pygame.sprite.spritecollide(self, self.game.all_sprites, False)
-
-        for sprite in collisions:
-            if sprite != self:
-                self.collided = True
-                self.damage = False
-                break
+        if self.game.broadphase.collide(self):
+            self.collided = True
+            self.damage = False
 
         if self.collided:
-            current_time = pygame.time.get_ticks()
+            current_time = self.game.virtual_clock.get_ticks()
             if current_time - self.last_change_time >= CHANGE_INTERVAL/3:
                 self.image_index += 1
                 if self.image_index < len(self.images):
@@ -209,13 +213,14 @@ class Spikes(pygame.sprite.Sprite):
         self.rect = self.image.get_rect()
         self.rect.topleft = (self.x, self.y)
         self.changing_speed = CHANGE_INTERVAL
-        self.last_change_time = pygame.time.get_ticks()
+        self.last_change_time = self.game.virtual_clock.get_ticks()
         self.damage = 32
         self.damage_time = 0
         self.inside = False
 
+    @profiled
     def update(self):
-        current_time = pygame.time.get_ticks()
+        current_time = self.game.virtual_clock.get_ticks()
         if self.damage == 0:
             if current_time - self.damage_time > 2000:
                 self.damage = 32
@@ -230,7 +235,7 @@ class Spikes(pygame.sprite.Sprite):
         if collisions and self.damage_time + 2000 < current_time:
             self.game.player.get_damage(32)
             self.damage = 0
-            self.damage_time = pygame.time.get_ticks()
+            self.damage_time = self.game.virtual_clock.get_ticks()
 
 class SemiDoors(pygame.sprite.Sprite):
     """Implementation of invisible 'door'- it is used when we change level on sub_level."""
@@ -238,7 +243,7 @@ class SemiDoors(pygame.sprite.Sprite):
         super().__init__()
         self.game = game
         self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.semidoors
+        self.groups = self.game.tiles, self.game.semidoors
         pygame.sprite.Sprite.__init__(self, self.groups)
 
         self.x = x * (TILESIZE) + 31
@@ -273,7 +278,7 @@ class NewTrap(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
         self.game = game
         self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.traps
+        self.groups = self.game.tiles, self.game.traps
         pygame.sprite.Sprite.__init__(self, self.groups)
 
         self.x = x * TILESIZE
@@ -292,7 +297,7 @@ class NewTrap(pygame.sprite.Sprite):
         self.blocked = False
 
     def update(self):
-        curr_time = pygame.time.get_ticks()
+        curr_time = self.game.virtual_clock.get_ticks()
         if curr_time >= self.dissapear_time + 200:
             self.image_index = 0
             self.blocked = True
@@ -300,11 +305,13 @@ class NewTrap(pygame.sprite.Sprite):
 
         collisions = pygame.sprite.spritecollide(self, self.game.players, False)
         if collisions:
-            self.collision_time = pygame.time.get_ticks()
+            self.collision_time = self.game.virtual_clock.get_ticks()
             self.image_index = 1
             self.image = self.images[self.image_index]
             self.game.player.trap_status = False
 
+        self.game.static_layer.refresh(self)
+
 class Lift(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
         self.game = game
@@ -326,14 +333,14 @@ class Lift(pygame.sprite.Sprite):
         self.rect.topleft = (self.x, self.y)
 
         self.collided = False
-        self.next_image_time = pygame.time.get_ticks()
+        self.next_image_time = self.game.virtual_clock.get_ticks()
         self.fall_speed = FALL_SPEED 
 
     def update(self):
         if not self.collided:
             self.rect.y -= self.fall_speed
 
-        collisions = pygame.sprite.spritecollide(self, self.game.blocks, False)
+        collisions = self.game.tile_grid.collide(self, 'blocks')
 
         for sprite in collisions:
             if sprite != self:
@@ -354,7 +361,7 @@ class Fakes(pygame.sprite.Sprite):
     def __init__(self, game, x, y):
         self.game = game
         self._layer = BLOCK_LAYER
-        self.groups = self.game.all_sprites, self.game.fakes
+        self.groups = self.game.tiles, self.game.fakes
         pygame.sprite.Sprite.__init__(self, self.groups)
         self.x = x * TILESIZE
         self.y = y * TILESIZE
@@ -1,13 +1,18 @@
 import pygame
 from config import *
 from game import *
+from replay import Recorder
+import os
+import time
 
 class Menu:
     """Class for the main menu of the game.
-    It allows the player to start the game, see the instructions and the high scores."""
-    def __init__(self):
+    It allows the player to start the game, see the instructions and the high scores.
+    level is the first level of the game, an index of the level tables or a path of a level file."""
+    def __init__(self, level = 0):
         pygame.init()
         pygame.mixer.init()  
+        SOUND_BANK.preload()
 
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         self.clock = pygame.time.Clock()
@@ -24,23 +29,41 @@ class Menu:
         self.results_rect = pygame.Rect(430, 220, 447, 72)
         self.back_rect = pygame.Rect(WIDTH - 150, HEIGHT - 100, 100, 50)
 
+        self.level = level
         self.running = True
         self.in_menu = True
         self.showing_instructions = False
         self.showing_results = False
+
+        self.screens = {}
+        self.scores_version = None
+        self.redraw = True
+        self.renders = 0
         
         play_music(MENU_MUSIC_PATH)
 
     def run(self):
+        """In event-driven mode the loop sleeps in pygame.event.wait and the screen
+        is redrawn only after a state change or when the window is exposed."""
         while self.running:
+            if MENU_EVENT_DRIVEN:
+                self.handle_event(pygame.event.wait(MENU_IDLE_TIMEOUT))
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    self.handle_mouse_click(event.pos)
-            self.render()
+                self.handle_event(event)
+            if self.redraw or not MENU_EVENT_DRIVEN:
+                self.render()
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self.handle_mouse_click(event.pos)
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.redraw = True
 
     def handle_mouse_click(self, pos):
+        """Switch the screen by a click, it is redrawn only when it changed."""
+        state = (self.in_menu, self.showing_instructions, self.showing_results)
         if self.in_menu:
             if self.game_rect.collidepoint(pos): 
                 self.in_menu = False
@@ -63,37 +86,72 @@ class Menu:
             self.showing_results = False
             self.in_menu = True
 
+        if state != (self.in_menu, self.showing_instructions, self.showing_results):
+            self.redraw = True
+
     def start_game(self):
         self.running = False 
-        game = Game()
+        game = Game(level = self.level)
+        # Recordings keep the index of the first level, games of level files are not recorded
+        recorder = Recorder(game) if RECORD_GAMES and isinstance(self.level, int) else None
         game.new()
         while game.running:
             game.main()
+        if recorder:
+            os.makedirs(RECORDINGS_DIRECTORY, exist_ok=True)
+            recorder.finish(os.path.join(RECORDINGS_DIRECTORY, f"{time.strftime('%Y%m%d-%H%M%S')}.rec"))
         
         self.running = True
         self.in_menu = True
+        self.screen = pygame.display.get_surface()
+        self.redraw = True
         pygame.mixer.music.stop()
         play_music(MENU_MUSIC_PATH)
+
+    def current_screen(self):
+        if self.showing_instructions:
+            return 'instructions'
+        if self.showing_results:
+            return 'results'
+        return 'menu'
         
     def render(self):
+        name = self.current_screen()
+        if name == 'results':
+            load_scores()
+            if self.scores_version != score_store().version:
+                self.scores_version = score_store().version
+                self.screens.pop('results', None)
+        if name not in self.screens:
+            self.screens[name] = self.compose(name)
+        self.screen.blit(self.screens[name], (0, 0))
+
+        pygame.display.flip()
+        self.redraw = False
+        self.renders += 1
+        self.clock.tick(FPS)
+
+    def compose(self, name):
+        """Draw the given menu screen once into a surface which is then reused."""
+        surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+
         def draw_text(text, font_size, position, center=False):
-            font = pygame.font.Font(FONT_PATH, font_size)
-            rendered_text = font.render(text, True, BLACK)
+            rendered_text = TEXT_CACHE.render(text, font_size, BLACK)
             if center:
                 position = (position[0] - rendered_text.get_width() // 2, position[1])
-            self.screen.blit(rendered_text, position)
+            surface.blit(rendered_text, position)
 
-        if self.showing_instructions:
-            self.screen.blit(self.instructions_background, (0, 0))
-            pygame.draw.rect(self.screen, GREY, self.back_rect, 0, 5)
-            pygame.draw.rect(self.screen, BLACK, self.back_rect, 2, 5)
+        if name == 'instructions':
+            surface.blit(self.instructions_background, (0, 0))
+            pygame.draw.rect(surface, GREY, self.back_rect, 0, 5)
+            pygame.draw.rect(surface, BLACK, self.back_rect, 2, 5)
             draw_text("Back", 36, (self.back_rect.x + 10, self.back_rect.y + 10))
 
-        elif self.showing_results:
-            self.screen.blit(self.results_image, (0, 0))
-            pygame.draw.rect(self.screen, GREY, pygame.Rect(60, 60, WIDTH - 120, HEIGHT - 164))
-            pygame.draw.rect(self.screen, GREY, self.back_rect)
-            pygame.draw.rect(self.screen, BLACK, self.back_rect, 2, 5)
+        elif name == 'results':
+            surface.blit(self.results_image, (0, 0))
+            pygame.draw.rect(surface, GREY, pygame.Rect(60, 60, WIDTH - 120, HEIGHT - 164))
+            pygame.draw.rect(surface, GREY, self.back_rect)
+            pygame.draw.rect(surface, BLACK, self.back_rect, 2, 5)
 
             
             draw_text("High scores", 50, (WIDTH // 2, 70), center=True)
@@ -104,7 +162,6 @@ class Menu:
                 draw_text(f"{i + 1}. {score['name']} - {score['time']}", 36, (WIDTH // 2, 130 + i * 50), center=True)
 
         else:
-            self.screen.blit(self.background, (0, 0))
-            
-        pygame.display.flip()
-        self.clock.tick(FPS)
\ No newline at end of file
+            surface.blit(self.background, (0, 0))
+
+        return surface
\ No newline at end of file
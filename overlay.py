@@ -0,0 +1,99 @@
+import time
+import pygame
+
+class PerformanceOverlay:
+    """Class for the performance overlay of the game, toggled while playing.
+    Time of every frame is split into parts (events, update, draw, tick) by lap calls
+    from the game loop. The overlay shows a graph of frame times and lines of text
+    given by the game, averaged over refresh frames. Text is rendered only on refresh,
+    every other frame scrolls the graph by one pixel and blits the cached surface.
+    cost is the time the overlay itself took in the last frame, in ms."""
+    PARTS = ('events', 'update', 'draw', 'tick')
+    BACKGROUND = (0, 0, 0)
+    GRAPH_COLOR = (0, 200, 0)
+    OVER_BUDGET_COLOR = (220, 40, 40)
+    BUDGET_COLOR = (220, 220, 0)
+    TEXT_COLOR = (255, 255, 255)
+
+    def __init__(self, font, position, budget, width = 320, graph_height = 60, refresh = 15, lines = 6):
+        self.font = font
+        self.budget = budget
+        self.refresh = refresh
+        self.visible = False
+        self.line_height = font.get_linesize()
+        self.surface = pygame.Surface((width, graph_height + lines * self.line_height + 12))
+        self.surface.set_alpha(210)
+        self.rect = self.surface.get_rect(topleft = position)
+        self.graph_rect = pygame.Rect(4, 4, width - 8, graph_height)
+        self.scale = graph_height / (2 * budget)
+
+        self.mark = time.perf_counter()
+        self.times = dict.fromkeys(self.PARTS, 0.0)
+        self.totals = dict.fromkeys(self.PARTS, 0.0)
+        self.frames = 0
+        self.draw_time = 0
+        self.cost = 0
+        self.clear()
+
+    def clear(self):
+        self.surface.fill(self.BACKGROUND)
+        self.frames = 0
+        self.totals = dict.fromkeys(self.PARTS, 0.0)
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.clear()
+
+    def begin(self):
+        """Start timing a frame."""
+        self.mark = time.perf_counter()
+        self.times = dict.fromkeys(self.PARTS, 0.0)
+
+    def lap(self, part):
+        """Add the time since the previous lap to the part of the frame."""
+        now = time.perf_counter()
+        self.times[part] += (now - self.mark) * 1000
+        self.mark = now
+
+    def end_frame(self, lines):
+        """Add the timed frame to the graph. lines is called for the text on refresh
+        with the average ms of every part."""
+        if not self.visible:
+            return
+        start = time.perf_counter()
+        for part, ms in self.times.items():
+            self.totals[part] += ms
+        self.frames += 1
+        self.add_to_graph(sum(self.times.values()))
+        if self.frames == self.refresh:
+            averages = {part: total / self.frames for part, total in self.totals.items()}
+            self.draw_text(lines(averages))
+            self.frames = 0
+            self.totals = dict.fromkeys(self.PARTS, 0.0)
+        self.cost = (time.perf_counter() - start) * 1000 + self.draw_time
+
+    def add_to_graph(self, ms):
+        graph = self.graph_rect
+        self.surface.set_clip(graph)
+        self.surface.scroll(-1, 0)
+        x = graph.right - 1
+        pygame.draw.line(self.surface, self.BACKGROUND, (x, graph.top), (x, graph.bottom - 1))
+        height = min(graph.height, int(ms * self.scale))
+        color = self.GRAPH_COLOR if ms <= self.budget else self.OVER_BUDGET_COLOR
+        if height:
+            pygame.draw.line(self.surface, color, (x, graph.bottom - height), (x, graph.bottom - 1))
+        self.surface.set_at((x, graph.bottom - 1 - int(self.budget * self.scale)), self.BUDGET_COLOR)
+        self.surface.set_clip(None)
+
+    def draw_text(self, lines):
+        top = self.graph_rect.bottom + 4
+        self.surface.fill(self.BACKGROUND, (0, top, self.rect.width, self.rect.height - top))
+        for i, line in enumerate(lines):
+            self.surface.blit(self.font.render(line, True, self.TEXT_COLOR), (6, top + i * self.line_height))
+
+    def draw(self, surface):
+        """Blit the overlay, returns its rect."""
+        start = time.perf_counter()
+        surface.blit(self.surface, self.rect)
+        self.draw_time = (time.perf_counter() - start) * 1000
+        return self.rect
@@ -1,5 +1,6 @@
 import pygame
 from config import *
+from profiling import profiled
 import math
 import random
 from enemy import Attack
@@ -81,6 +82,7 @@ class Player(pygame.sprite.Sprite):
             self.image = animations[math.floor(self.animation_loop)]
             self.animation_loop = (self.animation_loop + 0.1) % 3
                         
+    @profiled
     def update(self):
         self.movement()
         self.animate()
@@ -107,7 +109,7 @@ class Player(pygame.sprite.Sprite):
             self.press_flag = False
        
     def movement(self):
-        keys = pygame.key.get_pressed()
+        keys = self.game.input.get_pressed()
         
         if keys[pygame.K_DOWN] and self.get_next_level_pred():
             self.game.change_level = True
@@ -150,7 +152,7 @@ class Player(pygame.sprite.Sprite):
                     
     def collide_items(self):
         hits = pygame.sprite.spritecollide(self,self.game.potions.sprites() + self.game.swords.sprites(), False)
-        if hits and pygame.key.get_pressed()[pygame.K_DOWN]:
+        if hits and self.game.input.get_pressed()[pygame.K_DOWN]:
             for hit in hits:
                 hit.influence()
     
@@ -176,6 +178,7 @@ class Player(pygame.sprite.Sprite):
                 self.damage_resistance = False
                 self.damage_resistance_time = 0
     
+    @profiled
     def collide_blocks(self, direction):
         flag_lift = False
         flag_block = False
@@ -183,7 +186,7 @@ class Player(pygame.sprite.Sprite):
 
         if direction == "x":
             hits_press = pygame.sprite.spritecollide(self, self.game.movingblocks, False)
-            hits = pygame.sprite.spritecollide(self, self.game.collisions.sprites() + self.game.protections.sprites(), False)
+            hits = self.game.tile_grid.collide(self, 'collisions', 'protections')
             if hits:
                 no_hits_press_above = all(obj.rect.y < self.rect.y for obj in hits_press)
         
@@ -194,10 +197,10 @@ class Player(pygame.sprite.Sprite):
                     self.rect.x = hits[0].rect.right
 
         if direction == "y":
-            hits = pygame.sprite.spritecollide(self, self.game.collisions, False)
+            hits = self.game.tile_grid.collide(self, 'collisions')
             hits_lift = pygame.sprite.spritecollide(self, self.game.lift, False)
             hits_down = pygame.sprite.spritecollide(self, self.game.down_press, False)
-            hits_trap = pygame.sprite.spritecollide(self, self.game.traps, False)
+            hits_trap = self.game.tile_grid.collide(self, 'traps')
             hits_upper = pygame.sprite.spritecollide(self, self.game.upper_press, False)
             hits_press = pygame.sprite.spritecollide(self, self.game.movingblocks, False)
 
@@ -279,7 +282,7 @@ class Player(pygame.sprite.Sprite):
 
         hits = pygame.sprite.spritecollide(self, self.game.doors, False)
         hits_semi = pygame.sprite.spritecollide(self, self.game.semidoors, False)
-        trap_stands = pygame.sprite.spritecollide(self, self.game.traps, False)
+        trap_stands = self.game.tile_grid.collide(self, 'traps')
         if trap_stands:
             self.is_on_trap = True
         else:
@@ -369,6 +372,7 @@ class HealthBar(pygame.sprite.Sprite):
         
         self.x = size
         self.y = TILESIZE
+        self.hud = True
         self.width = 10 * TILESIZE
         self.height = TILESIZE // 2
         self.border_width = 2
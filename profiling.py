@@ -0,0 +1,120 @@
+"""Profiling of the hot paths of the game.
+Functions decorated with profiled are timed only when the POP_PROFILE environment
+variable is set before the game starts, otherwise the decorator returns them unchanged
+and they cost nothing. POP_PROFILE names the file written at exit: a .folded file gets
+collapsed stacks with the self time in us (for flame graph tools), any other file JSON
+with call counts and histograms of call durations. POP_PROFILE=1 writes profile.json, e.g.
+
+    POP_PROFILE=profile.folded python main.py"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+PROFILE_VARIABLE = 'POP_PROFILE'
+DEFAULT_PROFILE_PATH = 'profile.json'
+# Buckets keep this many significant bits of a duration in ns, so a bucket is at most
+# 1/16 of its lower bound wide
+SIGNIFICANT_BITS = 5
+
+class Histogram:
+    """Counts of durations in ns in logarithmic buckets with linear sub-buckets, like HdrHistogram."""
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        shift = max(0, ns.bit_length() - SIGNIFICANT_BITS)
+        bucket = ns >> shift << shift
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ns
+        self.max = max(self.max, ns)
+
+    def percentile(self, fraction):
+        """Lower bound of the bucket holding the given fraction of the durations."""
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.count:
+                return bucket
+        return 0
+
+    def stats(self):
+        return {
+            'calls': self.count,
+            'total_ms': self.total / 1e6,
+            'mean_us': self.total / max(1, self.count) / 1e3,
+            'p50_us': self.percentile(0.5) / 1e3,
+            'p90_us': self.percentile(0.9) / 1e3,
+            'p99_us': self.percentile(0.99) / 1e3,
+            'max_us': self.max / 1e3,
+            'buckets_ns': {str(bucket): count for bucket, count in sorted(self.buckets.items())},
+        }
+
+class Profiler:
+    """Histogram of every profiled function and self time of every stack of profiled calls.
+    Stacks are kept per thread, levels are built on the loader thread, and the
+    totals shared by the threads are updated under a lock."""
+    def __init__(self, path):
+        self.path = path
+        self.histograms = {}
+        self.stacks = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def wrap(self, function, name):
+        histogram = self.histograms.setdefault(name, Histogram())
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stack = getattr(self.local, 'stack', None)
+            if stack is None:
+                stack = self.local.stack = []
+            # name, ns spent in profiled calls made by this one
+            frame = [name, 0]
+            stack.append(frame)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                key = ';'.join(caller for caller, _ in stack)
+                with self.lock:
+                    histogram.record(elapsed)
+                    self.stacks[key] = self.stacks.get(key, 0) + elapsed - frame[1]
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+        return wrapper
+
+    def dump(self):
+        with self.lock:
+            self.write()
+
+    def write(self):
+        if self.path.endswith('.folded'):
+            with open(self.path, 'w') as file:
+                for stack, ns in sorted(self.stacks.items()):
+                    file.write(f"{stack} {ns // 1000}\n")
+        else:
+            with open(self.path, 'w') as file:
+                json.dump({name: histogram.stats() for name, histogram in self.histograms.items()
+                           if histogram.count}, file, indent=4)
+
+def start_profiler(path):
+    profiler = Profiler(DEFAULT_PROFILE_PATH if path == '1' else path)
+    atexit.register(profiler.dump)
+    return profiler
+
+PROFILER = start_profiler(os.environ[PROFILE_VARIABLE]) if os.environ.get(PROFILE_VARIABLE) else None
+
+def profiled(function):
+    """Decorator of a hot function, see the module docstring."""
+    if PROFILER is None:
+        return function
+    return PROFILER.wrap(function, function.__qualname__)
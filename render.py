@@ -0,0 +1,223 @@
+from collections import OrderedDict
+import pygame
+
+class StaticLayer:
+    """Class for the static part of the level.
+    Background image with all immovable tiles and brick fills composited on it once,
+    so the whole layer is drawn with a single blit. When a tile changes or disappears
+    only the area under it is patched.
+    A level larger than the background is cut into sections of the background size,
+    every section is composited when it comes into view and only capacity of them
+    are kept."""
+    def __init__(self, background, tiles, fills = (), size = None, capacity = 9):
+        self.background = background
+        self.section_width, self.section_height = background.get_size()
+        self.size = size or background.get_size()
+        self.capacity = capacity
+        self.sections = OrderedDict()
+        self.baked = {}
+        self.section_tiles = {}
+        self.section_fills = {}
+        self.patched = []
+        for image, rect in fills:
+            for key in self.section_range(rect):
+                self.section_fills.setdefault(key, []).append((image, rect))
+        for tile in tiles:
+            self.add(tile)
+
+    @property
+    def image(self):
+        """The first section, for a level which fits the background it is the whole layer."""
+        return self.section((0, 0))
+
+    def section_range(self, rect):
+        rows = range(rect.top // self.section_height, (rect.bottom - 1) // self.section_height + 1)
+        columns = range(rect.left // self.section_width, (rect.right - 1) // self.section_width + 1)
+        return [(col, row) for row in rows for col in columns]
+
+    def section(self, key):
+        surface = self.sections.get(key)
+        if surface is not None:
+            self.sections.move_to_end(key)
+            return surface
+
+        surface = self.background.copy()
+        origin = (key[0] * self.section_width, key[1] * self.section_height)
+        for image, rect in self.section_fills.get(key, ()):
+            self.fill(surface, origin, image, rect)
+        for tile in self.section_tiles.get(key, ()):
+            surface.blit(self.baked[tile], (tile.rect.x - origin[0], tile.rect.y - origin[1]))
+        self.sections[key] = surface
+        if len(self.sections) > self.capacity:
+            self.sections.popitem(last = False)
+        return surface
+
+    def fill(self, surface, origin, image, rect):
+        """Cover rect with copies of the image, e.g. a wall of bricks merged into one collider.
+        Only copies inside the clip area of the surface are blitted."""
+        width, height = image.get_size()
+        area = rect.clip(surface.get_clip().move(origin))
+        left = area.left - (area.left - rect.left) % width
+        top = area.top - (area.top - rect.top) % height
+        for y in range(top, area.bottom, height):
+            for x in range(left, area.right, width):
+                surface.blit(image, (x - origin[0], y - origin[1]))
+
+    def add(self, tile):
+        self.baked[tile] = tile.image
+        for key in self.section_range(tile.rect):
+            self.section_tiles.setdefault(key, []).append(tile)
+            if key in self.sections:
+                self.sections[key].blit(tile.image, (tile.rect.x - key[0] * self.section_width,
+                                                     tile.rect.y - key[1] * self.section_height))
+
+    def remove(self, tile):
+        if tile in self.baked:
+            del self.baked[tile]
+            for key in self.section_range(tile.rect):
+                self.section_tiles[key].remove(tile)
+            self.patch(tile.rect)
+
+    def refresh(self, tile):
+        """Patch the layer if the image of the tile has changed since it was baked."""
+        if tile in self.baked and self.baked[tile] is not tile.image:
+            self.baked[tile] = tile.image
+            self.patch(tile.rect)
+
+    def patch(self, rect):
+        rect = pygame.Rect(rect)
+        for key in self.section_range(rect):
+            surface = self.sections.get(key)
+            if surface is None:
+                continue
+            origin = (key[0] * self.section_width, key[1] * self.section_height)
+            local = rect.move(-origin[0], -origin[1])
+            surface.set_clip(local)
+            surface.blit(self.background, local, local)
+            for image, fill_rect in self.section_fills.get(key, ()):
+                if fill_rect.colliderect(rect):
+                    self.fill(surface, origin, image, fill_rect)
+            for tile in self.section_tiles.get(key, ()):
+                if tile.rect.colliderect(rect):
+                    surface.blit(self.baked[tile], (tile.rect.x - origin[0], tile.rect.y - origin[1]))
+            surface.set_clip(None)
+        self.patched.append(rect)
+
+    def take_patched(self):
+        """Return areas patched since the last call."""
+        patched, self.patched = self.patched, []
+        return patched
+
+    def prepare(self, view):
+        """Composite the sections under the view rect in advance, e.g. while the level is built."""
+        for key in self.section_range(view):
+            self.section(key)
+
+    def draw(self, surface, view):
+        """Blit the part of the layer under the view rect to surface."""
+        for key in self.section_range(view):
+            position = (key[0] * self.section_width - view.x, key[1] * self.section_height - view.y)
+            surface.blit(self.section(key), position)
+
+class Camera:
+    """Part of the level shown on the screen, in level coordinates.
+    It keeps the target in the middle of the screen but never shows anything outside
+    the level, so a level of the screen size is not scrolled at all."""
+    def __init__(self, width, height):
+        self.rect = pygame.Rect(0, 0, width, height)
+        self.bounds = self.rect.copy()
+
+    def set_bounds(self, width, height):
+        self.bounds = pygame.Rect(0, 0, width, height)
+        self.rect.topleft = (0, 0)
+
+    @property
+    def fixed(self):
+        return self.bounds.width <= self.rect.width and self.bounds.height <= self.rect.height
+
+    def follow(self, target):
+        self.center(target.rect)
+
+    def center(self, rect):
+        self.rect.center = rect.center
+        self.rect.clamp_ip(self.bounds)
+
+    def apply(self, rect):
+        """Return rect moved from level to screen coordinates."""
+        return rect.move(-self.rect.x, -self.rect.y)
+
+    def visible(self, sprites):
+        """Return sprites which are on the screen, in drawing order.
+        Sprites with hud set are positioned on the screen, not in the level."""
+        screen_rect = pygame.Rect((0, 0), self.rect.size)
+        return [sprite for sprite in sprites
+                if sprite.rect.colliderect(screen_rect if getattr(sprite, 'hud', False) else self.rect)]
+
+class Renderer:
+    """Class for drawing the level on the screen.
+    In dirty mode only areas under the previous and current positions of sprites,
+    the HUD and patched tiles are restored from the static layer and pushed to the
+    display. Otherwise (or after invalidate) the whole frame is redrawn.
+    A level larger than the screen is redrawn every frame as seen by the camera,
+    with sprites out of its view skipped."""
+    def __init__(self, screen, dirty):
+        self.screen = screen
+        self.screen_rect = screen.get_rect()
+        self.dirty = dirty
+        self.full_redraw = True
+        self.hud_rects = []
+        self.pixels = 0
+
+    def invalidate(self):
+        """Force full redraw of the next frame, e.g. after a level or screen change."""
+        self.full_redraw = True
+        self.pixels = self.screen_rect.width * self.screen_rect.height
+
+    def set_dirty(self, dirty):
+        self.dirty = dirty
+        self.invalidate()
+
+    def draw(self, static_layer, sprites, draw_hud, camera):
+        """Draw one frame. draw_hud draws the HUD on the given surface and returns the list of
+        rects it covers, each restored on its own in the next frame.
+        Returns the list of rects which have to be updated on the display."""
+        if not camera.fixed:
+            return self.draw_view(static_layer, sprites, draw_hud, camera)
+
+        if not self.dirty or self.full_redraw:
+            self.screen.blit(static_layer.image, (0, 0))
+            static_layer.take_patched()
+            sprites.draw(self.screen)
+            self.hud_rects = draw_hud(self.screen)
+            self.full_redraw = False
+            self.pixels = self.screen_rect.width * self.screen_rect.height
+            return [self.screen_rect]
+
+        sprites.clear(self.screen, static_layer.image)
+        rects = static_layer.take_patched()
+        for rect in rects:
+            self.screen.blit(static_layer.image, rect, rect)
+        for rect in self.hud_rects:
+            self.screen.blit(static_layer.image, rect, rect)
+            rects.append(rect)
+
+        rects += sprites.draw(self.screen)
+        self.hud_rects = draw_hud(self.screen)
+        rects += self.hud_rects
+
+        self.pixels = 0
+        for rect in rects:
+            clipped = rect.clip(self.screen_rect)
+            self.pixels += clipped.width * clipped.height
+        return rects
+
+    def draw_view(self, static_layer, sprites, draw_hud, camera):
+        static_layer.draw(self.screen, camera.rect)
+        static_layer.take_patched()
+        for sprite in camera.visible(sprites):
+            rect = sprite.rect if getattr(sprite, 'hud', False) else camera.apply(sprite.rect)
+            self.screen.blit(sprite.image, rect)
+        self.hud_rects = draw_hud(self.screen)
+        self.full_redraw = True
+        self.pixels = self.screen_rect.width * self.screen_rect.height
+        return [self.screen_rect]
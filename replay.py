@@ -0,0 +1,181 @@
+"""Recording and replay of games.
+A recording keeps the seed of the random module, the first level and the keys held in every step of the simulation, run-length
+encoded, with digests of the game state every CHECKPOINT_INTERVAL steps. Replaying
+it in a headless game has to give the same digests.
+Keys handled by Game.events (the debugging keys) are not recorded.
+Run python replay.py <recording> to replay and verify a recording."""
+import hashlib
+import struct
+import sys
+import time
+import pygame
+from inputs import PressedKeys
+
+RECORDING_MAGIC = b'POPR'
+RECORDING_VERSION = 2
+# Keys read by the player, bit i of a step is set when RECORDED_KEYS[i] is held
+RECORDED_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN, pygame.K_SPACE)
+CHECKPOINT_INTERVAL = 300
+# magic, version, seed, first level, steps, runs, checkpoints
+HEADER = struct.Struct('<4sHQHIII')
+# steps, keys mask
+RUN = struct.Struct('<HB')
+# step, digest of the state after it
+CHECKPOINT = struct.Struct('<I8s')
+
+def keys_mask(pressed):
+    return sum(1 << bit for bit, key in enumerate(RECORDED_KEYS) if pressed[key])
+
+def held_keys(mask):
+    return tuple(key for bit, key in enumerate(RECORDED_KEYS) if mask & 1 << bit)
+
+def mask_keys(mask):
+    return PressedKeys(held_keys(mask))
+
+def state_digest(game):
+    """Short digest of the state of the game: time, level, the player and all sprites."""
+    player = game.player
+    state = [game.steps, game.current_level_index, game.time_left, game.virtual_clock.get_ticks(),
+             tuple(player.rect), player.current_health, player.speed]
+    for sprite in game.all_sprites:
+        state.append((type(sprite).__name__, tuple(sprite.rect), getattr(sprite, 'current_health', None)))
+    return hashlib.sha1(repr(state).encode()).digest()[:CHECKPOINT.size - 4]
+
+class Recording:
+    """Input of one game, see the module docstring."""
+    def __init__(self, seed, level):
+        self.seed = seed
+        self.level = level
+        self.masks = []
+        self.checkpoints = {}
+
+    def runs(self):
+        """Return [steps, keys mask] of every run of steps with the same keys held."""
+        runs = []
+        for mask in self.masks:
+            if runs and runs[-1][1] == mask and runs[-1][0] < 0xFFFF:
+                runs[-1][0] += 1
+            else:
+                runs.append([1, mask])
+        return runs
+
+    def script(self):
+        """Return the keys as a script of inputs.ScriptedInput."""
+        return [(steps, held_keys(mask)) for steps, mask in self.runs()]
+
+    def save(self, path):
+        runs = self.runs()
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.seed, self.level,
+                                   len(self.masks), len(runs), len(self.checkpoints)))
+            file.write(b''.join(RUN.pack(*run) for run in runs))
+            file.write(b''.join(CHECKPOINT.pack(step, digest) for step, digest in sorted(self.checkpoints.items())))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, seed, level, steps, runs, checkpoints = HEADER.unpack_from(data, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a recording of this version")
+        recording = cls(seed, level)
+        offset = HEADER.size
+        for count, mask in RUN.iter_unpack(data[offset:offset + RUN.size * runs]):
+            recording.masks += [mask] * count
+        offset += RUN.size * runs
+        for step, digest in CHECKPOINT.iter_unpack(data[offset:offset + CHECKPOINT.size * checkpoints]):
+            recording.checkpoints[step] = digest
+        if len(recording.masks) != steps:
+            raise ValueError(f"{path} is truncated")
+        return recording
+
+class Recorder:
+    """Input source which records the keys of another one, set as the input of the game.
+    The keys are read once per step, so the game uses exactly what was recorded.
+    Nothing is recorded after the step which finished the game, like Game.run_headless
+    the replay stops there."""
+    def __init__(self, game, checkpoint_interval = CHECKPOINT_INTERVAL):
+        self.game = game
+        self.source = game.input
+        self.checkpoint_interval = checkpoint_interval
+        self.recording = Recording(game.seed, game.current_level_index)
+        self.pressed = PressedKeys()
+        game.input = self
+
+    def next_step(self):
+        if self.game.new_record:
+            return
+        done = self.game.steps - 1
+        if done and done % self.checkpoint_interval == 0:
+            self.recording.checkpoints[done] = state_digest(self.game)
+        self.source.next_step()
+        mask = keys_mask(self.source.get_pressed())
+        self.recording.masks.append(mask)
+        self.pressed = mask_keys(mask)
+
+    def get_pressed(self):
+        return self.pressed
+
+    def finish(self, path):
+        """Store the digest of the final state and save the recording."""
+        self.recording.checkpoints[self.game.steps] = state_digest(self.game)
+        self.recording.save(path)
+
+class Replayer:
+    """Input source which plays a recording and compares the state with its checkpoints.
+    mismatch is the first step after which the state differs."""
+    def __init__(self, recording):
+        self.recording = recording
+        self.game = None
+        self.pressed = PressedKeys()
+        self.mismatch = None
+        self.verified = 0
+
+    def next_step(self):
+        done = self.game.steps - 1
+        self.check(done)
+        if done < len(self.recording.masks):
+            self.pressed = mask_keys(self.recording.masks[done])
+        else:
+            self.pressed = PressedKeys()
+
+    def check(self, step):
+        digest = self.recording.checkpoints.get(step)
+        if digest is None:
+            return
+        if digest == state_digest(self.game):
+            self.verified += 1
+        elif self.mismatch is None:
+            self.mismatch = step
+
+    def get_pressed(self):
+        return self.pressed
+
+def replay(recording):
+    """Replay the recording in a new headless game, init_headless has to be called before.
+    Returns the game and the replayer."""
+    from headless import new_game
+    replayer = Replayer(recording)
+    game = new_game(replayer, recording.level, recording.seed)
+    replayer.game = game
+    game.run_headless(len(recording.masks))
+    replayer.check(game.steps)
+    return game, replayer
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("usage: python replay.py <recording>")
+        sys.exit(2)
+    from headless import init_headless
+    init_headless()
+    recording = Recording.load(sys.argv[1])
+    start = time.perf_counter()
+    game, replayer = replay(recording)
+    elapsed = time.perf_counter() - start
+    print(f"{game.steps} of {len(recording.masks)} steps in {elapsed:.2f} s, "
+          f"{replayer.verified} of {len(recording.checkpoints)} checkpoints match")
+    if replayer.mismatch is not None:
+        print(f"state differs after step {replayer.mismatch}")
+    game.level_loader.shutdown()
+    pygame.quit()
+    sys.exit(0 if replayer.mismatch is None and replayer.verified == len(recording.checkpoints) else 1)
@@ -0,0 +1,204 @@
+import bisect
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+class ScoreStore:
+    """Legacy JSON backend of the high scores.
+    The leaderboard is read from the file once and kept in memory sorted by score,
+    it is read again only when the file is changed by someone else. New results are
+    inserted in place and the file is written atomically on a background thread."""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.scores = []
+        self.stamp = None
+        self.loaded = False
+        self.version = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.writer = None
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """Return the leaderboard, reading the file only if it has changed."""
+        with self.lock:
+            stamp = self.file_stamp()
+            if not self.loaded or stamp != self.stamp:
+                self.scores = self.read()
+                self.stamp = stamp
+                self.loaded = True
+                self.version += 1
+            return list(self.scores)
+
+    def read(self):
+        try:
+            with open(self.path, 'r') as file:
+                scores = json.load(file)
+        except FileNotFoundError:
+            return []
+        scores.sort(key=lambda x: x['score'], reverse=True)
+        return scores[:self.size]
+
+    def add(self, name, time, score, splits = ()):
+        """Insert a result keeping the leaderboard sorted, equal scores keep the older first.
+        Level splits are not stored by this backend."""
+        self.load()
+        with self.lock:
+            bisect.insort(self.scores, {"name": name, "time": time, "score": score}, key=lambda x: -x['score'])
+            del self.scores[self.size:]
+            self.version += 1
+        self.save_async()
+
+    def replace(self, scores):
+        with self.lock:
+            self.scores = sorted(scores, key=lambda x: x['score'], reverse=True)[:self.size]
+            self.loaded = True
+            self.version += 1
+        self.save_async()
+
+    def save_async(self):
+        self.writer = threading.Thread(target=self.write)
+        self.writer.start()
+
+    def write(self):
+        """Write the current leaderboard to a temporary file and rename it over the old one."""
+        with self.write_lock:
+            with self.lock:
+                scores = list(self.scores)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as file:
+                json.dump(scores, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(file.name, self.path)
+            with self.lock:
+                self.stamp = self.file_stamp()
+
+    def flush(self):
+        """Wait for the last write to finish."""
+        if self.writer is not None:
+            self.writer.join()
+
+class SqliteScoreStore:
+    """SQLite backend of the high scores.
+    Every finished run is stored with its level splits (time spent on each level
+    in ms). The database works in WAL mode and has indexes for the top results,
+    the best result of a player and the best split of a level. The leaderboard
+    returned by load is cached until someone writes to the database."""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.scores = []
+        self.data_version = None
+        self.changed = True
+        self.version = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                time TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                finished REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC, id);
+            CREATE INDEX IF NOT EXISTS runs_by_name ON runs (name, score DESC);
+            CREATE TABLE IF NOT EXISTS splits (
+                run_id INTEGER NOT NULL REFERENCES runs (id),
+                level INTEGER NOT NULL,
+                time INTEGER NOT NULL,
+                PRIMARY KEY (run_id, level)
+            );
+            CREATE INDEX IF NOT EXISTS splits_by_level ON splits (level, time);
+        """)
+
+    def is_empty(self):
+        return self.connection.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+
+    def load(self):
+        """Return the leaderboard, querying the database only if it has changed."""
+        with self.lock:
+            data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+            if self.changed or data_version != self.data_version:
+                self.scores = self.top(self.size)
+                self.data_version = data_version
+                self.changed = False
+                self.version += 1
+            return list(self.scores)
+
+    def insert(self, name, time_text, score, splits = ()):
+        cursor = self.connection.execute("INSERT INTO runs (name, time, score, finished) VALUES (?, ?, ?, ?)",
+                                         (name, time_text, score, time.time()))
+        self.connection.executemany("INSERT INTO splits (run_id, level, time) VALUES (?, ?, ?)",
+                                    [(cursor.lastrowid, level, split) for level, split in enumerate(splits)])
+
+    def add(self, name, time, score, splits = ()):
+        with self.lock, self.connection:
+            self.insert(name, time, score, splits)
+            self.changed = True
+
+    def replace(self, scores):
+        """Replace all stored runs and their splits with the given results."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM splits")
+            self.connection.execute("DELETE FROM runs")
+            for score in scores:
+                self.insert(score['name'], score['time'], score['score'])
+            self.changed = True
+
+    def top(self, count):
+        rows = self.connection.execute("SELECT name, time, score FROM runs ORDER BY score DESC, id LIMIT ?", (count,))
+        return [dict(row) for row in rows]
+
+    def best_of(self, name):
+        row = self.connection.execute("SELECT name, time, score FROM runs WHERE name = ? ORDER BY score DESC LIMIT 1",
+                                      (name,)).fetchone()
+        return dict(row) if row else None
+
+    def best_per_name(self, count):
+        rows = self.connection.execute("SELECT name, MAX(score) AS score FROM runs GROUP BY name "
+                                       "ORDER BY score DESC LIMIT ?", (count,))
+        return [dict(row) for row in rows]
+
+    def best_splits(self, level, count):
+        rows = self.connection.execute("SELECT runs.name, splits.time FROM splits JOIN runs ON runs.id = splits.run_id "
+                                       "WHERE splits.level = ? ORDER BY splits.time LIMIT ?", (level, count))
+        return [dict(row) for row in rows]
+
+    def splits_of(self, run_id):
+        rows = self.connection.execute("SELECT level, time FROM splits WHERE run_id = ? ORDER BY level", (run_id,))
+        return [row['time'] for row in rows]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.connection.close()
+
+def open_score_store(backend, json_path, database_path, size):
+    """Return the score store for the given backend ('sqlite' or 'json').
+    A new SQLite database starts with the results from the JSON file."""
+    if backend == 'json':
+        return ScoreStore(json_path, size)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown scores backend: {backend}")
+
+    store = SqliteScoreStore(database_path, size)
+    if store.is_empty():
+        store.replace(ScoreStore(json_path, size).load())
+    return store
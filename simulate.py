@@ -0,0 +1,146 @@
+"""Monte Carlo balance runs: many headless games played on a pool of worker processes.
+Every run plays one level from its start with its own seed and a scripted or random
+player, and reports whether the level was completed, the game time it took and the
+damage taken. Constants of config and class attributes (like Sword.SWORD_TYPES) can be
+changed for all runs, e.g.
+    python simulate.py --runs 1000 --policy random --set ENEMY_BLUE_DAMAGE=24"""
+import argparse
+import ast
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import pygame
+import config
+from headless import DEMO_SCRIPT, init_headless, new_game
+from inputs import ScriptedInput, RandomInput
+
+# Keys held by the random policy, each choice for a random number of steps
+RANDOM_CHOICES = [
+    (), (pygame.K_RIGHT,), (pygame.K_LEFT,), (pygame.K_UP,), (pygame.K_DOWN,), (pygame.K_SPACE,),
+    (pygame.K_RIGHT, pygame.K_UP), (pygame.K_LEFT, pygame.K_UP),
+    (pygame.K_RIGHT, pygame.K_SPACE), (pygame.K_LEFT, pygame.K_SPACE),
+]
+# Modules which star import config, so a constant has to be changed in all of them
+GAME_MODULES = ('config', 'mapa', 'player', 'enemy', 'items', 'levels', 'game')
+override_error = None
+
+def parse_override(text):
+    name, _, value = text.partition('=')
+    return name.strip(), ast.literal_eval(value.strip())
+
+def apply_overrides(overrides):
+    """Set NAME in every game module which has it, or the attribute of Class.NAME."""
+    import game
+    modules = [sys.modules[name] for name in GAME_MODULES]
+    for name, value in overrides:
+        owner, _, attribute = name.rpartition('.')
+        found = False
+        for module in modules:
+            target = getattr(module, owner, None) if owner else module
+            if target is not None and hasattr(target, attribute):
+                setattr(target, attribute, value)
+                found = True
+        if not found:
+            raise ValueError(f"unknown constant {name}")
+
+def start_worker(overrides):
+    """Initializer of a worker process, started by spawn so nothing of the parent is inherited.
+    An unknown constant is raised by the first run, an initializer which fails is just restarted."""
+    global override_error
+    init_headless()
+    try:
+        apply_overrides(overrides)
+    except ValueError as error:
+        override_error = error
+
+def simulate(task):
+    """Play one level until it is completed or lost, or max_steps are done."""
+    if override_error:
+        raise override_error
+    level, seed, policy, max_steps = task
+    if policy == 'random':
+        source = RandomInput(seed, RANDOM_CHOICES)
+    else:
+        source = ScriptedInput(DEMO_SCRIPT, loop = True)
+    game = new_game(source, level, seed, preload_levels = False)
+    game.show_special_image_flag = False
+    time_left = game.time_left
+    health = game.player.current_health
+    damage = 0
+    outcome = 'unfinished'
+    while game.steps < max_steps:
+        game.step()
+        if game.current_level_index != level or game.new_record:
+            outcome = 'completed'
+            break
+        damage += max(0, health - game.player.current_health)
+        health = game.player.current_health
+        if game.game_over_flag:
+            outcome = 'died' if health <= 0 else 'out of time'
+            break
+    game.level_loader.shutdown()
+    return {'level': level, 'seed': seed, 'outcome': outcome, 'time_ms': time_left - game.time_left,
+            'damage': damage, 'steps': game.steps}
+
+def summarize(results):
+    """Aggregate the runs per level: survival rate, completion time and damage taken."""
+    levels = {}
+    for result in results:
+        levels.setdefault(result['level'], []).append(result)
+    summary = {}
+    for level, runs in sorted(levels.items()):
+        completed = [run['time_ms'] / 1000 for run in runs if run['outcome'] == 'completed']
+        damage = [run['damage'] for run in runs]
+        summary[level] = {
+            'runs': len(runs),
+            'outcomes': {outcome: sum(run['outcome'] == outcome for run in runs)
+                         for outcome in ('completed', 'died', 'out of time', 'unfinished')},
+            'survival_rate': sum(run['outcome'] != 'died' for run in runs) / len(runs),
+            'completion_rate': len(completed) / len(runs),
+            'completion_time_s': {'mean': statistics.mean(completed), 'p50': statistics.median(completed)}
+                                 if completed else None,
+            'damage': {'mean': statistics.mean(damage), 'max': max(damage)},
+        }
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=100, help="runs of every level")
+    parser.add_argument('--levels', type=int, nargs='+', default=list(range(len(config.levels))))
+    parser.add_argument('--policy', choices=('script', 'random'), default='random')
+    parser.add_argument('--seconds', type=int, default=180, help="game time after which a run is unfinished")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--set', dest='overrides', type=parse_override, action='append', default=[],
+                        metavar='NAME=VALUE')
+    parser.add_argument('--output', help="JSON file for the summary")
+    args = parser.parse_args()
+
+    for level in args.levels:
+        config.LEVEL_CACHE.load(level)
+    max_steps = args.seconds * config.TICK_RATE
+    tasks = [(level, args.seed * 1000003 + level * args.runs + run, args.policy, max_steps)
+             for level in args.levels for run in range(args.runs)]
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes, initializer=start_worker, initargs=(args.overrides,)) as pool:
+        chunksize = max(1, len(tasks) // (args.processes * 8))
+        results = list(pool.imap_unordered(simulate, tasks, chunksize))
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+
+    print(f"{len(results)} runs on {args.processes} processes in {elapsed:.1f} s, {len(results) / elapsed:.1f} runs/s, "
+          f"{sum(result['steps'] for result in results) / elapsed:.0f} steps/s")
+    print(f"{'level':>6} {'runs':>6} {'survival':>9} {'completed':>10} {'time p50 s':>11} {'damage':>8}")
+    for level, stats in summary.items():
+        completion = stats['completion_time_s']
+        print(f"{level:>6} {stats['runs']:>6} {stats['survival_rate']:>9.1%} {stats['completion_rate']:>10.1%} "
+              f"{completion['p50'] if completion else float('nan'):>11.1f} {stats['damage']['mean']:>8.1f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'policy': args.policy, 'overrides': dict(args.overrides), 'levels': summary}, file, indent=4)
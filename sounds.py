@@ -0,0 +1,114 @@
+import time
+import pygame
+
+class SoundBank:
+    """Class for the sound effects of the game.
+    Every effect is decoded once (at preload or on first use) and kept in memory.
+    Sounds are played on a bounded pool of mixer channels, each effect has its own
+    polyphony limit and priority used when the pool is full."""
+    def __init__(self, voices):
+        self.voices = voices
+        self.settings = {}
+        self.sounds = {}
+
+        self.channels = []
+        self.owners = []
+        self.play_count = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.decode_time = 0
+        self.dropped = 0
+        self.stolen = 0
+
+    def register(self, path, volume, polyphony = 2, priority = 0):
+        self.settings[path] = (volume, polyphony, priority)
+
+    def open(self):
+        """Reserve the voice pool. Mixer has to be initialized before."""
+        if pygame.mixer.get_num_channels() < self.voices:
+            pygame.mixer.set_num_channels(self.voices)
+        self.channels = [pygame.mixer.Channel(i) for i in range(self.voices)]
+        self.owners = [None] * self.voices
+
+    def preload(self):
+        if not self.channels:
+            self.open()
+        for path in self.settings:
+            self.load(path)
+
+    def load(self, path):
+        sound = self.sounds.get(path)
+        if sound is not None:
+            self.hits += 1
+            return sound
+
+        self.misses += 1
+        start = time.perf_counter()
+        sound = pygame.mixer.Sound(path)
+        self.decode_time += time.perf_counter() - start
+        self.sounds[path] = sound
+        return sound
+
+    def find_channel(self, path, polyphony, priority):
+        """Return index of the channel for new sound or None when sound has to be dropped."""
+        free = None
+        same = []
+        victim = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                self.owners[i] = None
+            owner = self.owners[i]
+            if owner is None:
+                if free is None:
+                    free = i
+                continue
+            if owner[0] == path:
+                same.append(i)
+            if owner[1] < priority and (victim is None or owner[1:] < self.owners[victim][1:]):
+                victim = i
+
+        if len(same) >= polyphony:
+            return min(same, key=lambda i: self.owners[i][2])
+        if free is not None:
+            return free
+        if victim is not None:
+            self.stolen += 1
+            return victim
+        return None
+
+    def play(self, path, volume = None):
+        if not pygame.mixer.get_init():
+            return None
+        if not self.channels:
+            self.open()
+        if path not in self.settings:
+            self.register(path, 1.0 if volume is None else volume)
+        default_volume, polyphony, priority = self.settings[path]
+
+        sound = self.load(path)
+        index = self.find_channel(path, polyphony, priority)
+        if index is None:
+            self.dropped += 1
+            return None
+
+        self.play_count += 1
+        self.owners[index] = (path, priority, self.play_count)
+        channel = self.channels[index]
+        channel.play(sound)
+        channel.set_volume(default_volume if volume is None else volume)
+        return channel
+
+    def busy_voices(self):
+        return sum(1 for channel in self.channels if channel.get_busy())
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'decode_time_ms': self.decode_time * 1000,
+            'dropped': self.dropped,
+            'stolen': self.stolen,
+            'voices': self.voices,
+            'busy_voices': self.busy_voices(),
+        }
@@ -0,0 +1,225 @@
+import re
+from array import array
+import pygame
+
+class Collider:
+    """Solid rectangle of merged bricks, given in tiles. It is not a sprite, bricks
+    are drawn by the static layer. A large level has millions of them, so they have no __dict__."""
+    __slots__ = ('tile_size', 'rect')
+
+    def __init__(self, x, y, columns, rows, tile_size):
+        self.tile_size = tile_size
+        self.rect = pygame.Rect(x * tile_size, y * tile_size, columns * tile_size, rows * tile_size)
+
+    def alive(self):
+        return True
+
+    def first_cell(self, rect):
+        """Return (row, column) of the first tile of the collider, in reading order, overlapped by rect."""
+        return max(self.rect.top, rect.top) // self.tile_size, max(self.rect.left, rect.left) // self.tile_size
+
+    def cell(self, row, column):
+        return Collider(column, row, 1, 1, self.tile_size)
+
+class TileMerger:
+    """Greedy meshing of the tiles with given code into rectangles [x, y, columns, rows],
+    fed one row of the tile map at a time. A rectangle starts at the first free tile
+    of a run, takes the whole run to the right and then grows down while the row below
+    has the code under all its columns. Only rectangles touching the last row are kept
+    open, so memory does not depend on the height of the map."""
+    def __init__(self, code):
+        self.code = code
+        self.pattern = re.compile(re.escape(code) + '+')
+        self.rects = []
+        self.open = []
+        self.y = 0
+
+    def add_row(self, row):
+        still_open = []
+        for rect in self.open:
+            x, width = rect[0], rect[2]
+            if row[x:x + width] == self.code * width:
+                rect[3] += 1
+                still_open.append(rect)
+        if still_open:
+            parts = []
+            start = 0
+            for x, _, width, _ in still_open:
+                parts += [row[start:x], ' ' * width]
+                start = x + width
+            parts.append(row[start:])
+            row = ''.join(parts)
+
+        for run in self.pattern.finditer(row):
+            rect = [run.start(), self.y, run.end() - run.start(), 1]
+            self.rects.append(rect)
+            still_open.append(rect)
+        self.open = sorted(still_open, key=lambda rect: rect[0])
+        self.y += 1
+
+def merge_tiles(tilemap, code):
+    """Return rectangles (x, y, columns, rows) covering the tiles with given code, see TileMerger."""
+    merger = TileMerger(code)
+    for row in tilemap:
+        merger.add_row(row)
+    return [tuple(rect) for rect in merger.rects]
+
+class TileGrid:
+    """Uniform grid index of the level tiles used for collision queries.
+    Immovable tiles are put into the cells they cover, so a query looks only at the few
+    cells under the rect. Merged colliders do not overlap, so they are indexed once in
+    an array with the number of the collider (from 1) covering each cell, shared by the
+    solid kinds. Moving members of a kind (falling bricks, press) are kept in a small
+    group checked directly.
+    Results are in reading order of the tiles, the order pygame.sprite.spritecollide
+    returned for one sprite per tile. A hit collider is returned as its first tile
+    overlapped by the rect, which is the tile the old per-tile query returned first."""
+    def __init__(self, columns, rows, cell_size):
+        self.columns = columns
+        self.rows = rows
+        self.cell_size = cell_size
+        self.cells = {}
+        self.dynamic = {}
+        self.groups = {}
+        self.placed = {}
+        self.solid = set()
+        self.colliders = []
+        self.collider_cells = array('I')
+
+    def cell_range(self, rect):
+        left = min(max(rect.left // self.cell_size, 0), self.columns - 1)
+        right = min(max((rect.right - 1) // self.cell_size, 0), self.columns - 1)
+        top = min(max(rect.top // self.cell_size, 0), self.rows - 1)
+        bottom = min(max((rect.bottom - 1) // self.cell_size, 0), self.rows - 1)
+        return left, right, top, bottom
+
+    def place(self, kind, item):
+        cells = self.cells[kind]
+        left, right, top, bottom = self.cell_range(item.rect)
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                cells.setdefault(row * self.columns + col, []).append(item)
+                self.placed.setdefault(item, []).append((kind, row * self.columns + col))
+
+    def add_colliders(self, colliders):
+        """Index the merged colliders, queries of solid kinds return them."""
+        self.colliders = colliders
+        self.collider_cells = array('I', [0]) * (self.columns * self.rows)
+        for number, collider in enumerate(colliders, 1):
+            rect = collider.rect
+            left, top = rect.left // self.cell_size, rect.top // self.cell_size
+            width = rect.width // self.cell_size
+            run = array('I', [number]) * width
+            for row in range(top, top + rect.height // self.cell_size):
+                start = row * self.columns + left
+                self.collider_cells[start:start + width] = run
+
+    def add(self, kind, group, static_group, solid = False):
+        """Index all sprites of the group under given kind name, with the colliders if solid.
+        Sprites need tile_index, the (row, column) of the tile they were made from.
+        Sprites which belong to static_group are placed in the grid cells."""
+        self.cells.setdefault(kind, {})
+        self.groups[kind] = group
+        dynamic = self.dynamic.setdefault(kind, pygame.sprite.Group())
+        if solid:
+            self.solid.add(kind)
+
+        for sprite in group.sprites():
+            if static_group.has(sprite):
+                self.place(kind, sprite)
+            else:
+                dynamic.add(sprite)
+
+    def track(self, sprite):
+        """Index a moving sprite created after the grid, under kinds whose group it is in."""
+        for kind, group in self.groups.items():
+            if group.has(sprite):
+                self.dynamic[kind].add(sprite)
+
+    def remove(self, sprite):
+        for kind, index in self.placed.pop(sprite, []):
+            self.cells[kind][index].remove(sprite)
+        for dynamic in self.dynamic.values():
+            dynamic.remove(sprite)
+
+    def query(self, rect, *kinds):
+        """Return sprites of given kinds which collide with rect, kind after kind."""
+        left, right, top, bottom = self.cell_range(rect)
+        result = []
+        for kind in kinds:
+            cells = self.cells[kind]
+            solid = kind in self.solid
+            found = {}
+            for row in range(top, bottom + 1):
+                for col in range(left, right + 1):
+                    index = row * self.columns + col
+                    for item in cells.get(index, ()):
+                        if item not in found and item.rect.colliderect(rect):
+                            found[item] = item.tile_index
+                    number = self.collider_cells[index] if solid else 0
+                    if number:
+                        collider = self.colliders[number - 1]
+                        if collider not in found and collider.rect.colliderect(rect):
+                            found[collider] = collider.first_cell(rect)
+            for sprite in self.dynamic[kind]:
+                if sprite.rect.colliderect(rect):
+                    found[sprite] = sprite.tile_index
+
+            for item, index in sorted(found.items(), key=lambda hit: hit[1]):
+                result.append(item.cell(*index) if isinstance(item, Collider) else item)
+        return result
+
+    def collide(self, sprite, *kinds):
+        return self.query(sprite.rect, *kinds)
+
+class Broadphase:
+    """Bucketed grid over all sprites of the level for 'collide with anything' queries.
+    Static tiles are bucketed once, the other sprites are re-bucketed at the beginning
+    of every update. Sprites which moved since then are still found because queries
+    look at buckets around the rect extended by margin and the exact test is done on
+    current rects."""
+    def __init__(self, static_sprites, dynamic_sprites, bucket_size, margin):
+        self.dynamic_sprites = dynamic_sprites
+        self.bucket_size = bucket_size
+        self.margin = margin
+        self.static_buckets = {}
+        self.dynamic_buckets = {}
+        for sprite in static_sprites:
+            self.insert(self.static_buckets, sprite)
+
+    def bucket_range(self, rect):
+        return (rect.left // self.bucket_size, (rect.right - 1) // self.bucket_size,
+                rect.top // self.bucket_size, (rect.bottom - 1) // self.bucket_size)
+
+    def insert(self, buckets, sprite):
+        left, right, top, bottom = self.bucket_range(sprite.rect)
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                bucket = buckets.get((col, row))
+                if bucket is None:
+                    buckets[(col, row)] = [sprite]
+                else:
+                    bucket.append(sprite)
+
+    def rebuild(self):
+        self.dynamic_buckets = {}
+        for sprite in self.dynamic_sprites:
+            self.insert(self.dynamic_buckets, sprite)
+
+    def query(self, rect):
+        """Return alive sprites which collide with rect."""
+        left, right, top, bottom = self.bucket_range(rect.inflate(2 * self.margin, 2 * self.margin))
+        found = set()
+        for buckets in (self.static_buckets, self.dynamic_buckets):
+            for row in range(top, bottom + 1):
+                for col in range(left, right + 1):
+                    for sprite in buckets.get((col, row), ()):
+                        if sprite.rect.colliderect(rect) and sprite.alive():
+                            found.add(sprite)
+        return found
+
+    def collide(self, sprite):
+        """Return other sprites which collide with given sprite."""
+        found = self.query(sprite.rect)
+        found.discard(sprite)
+        return found
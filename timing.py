@@ -0,0 +1,49 @@
+import time
+
+class VirtualClock:
+    """Game time in ms. It is advanced by the simulation step instead of following the
+    wall clock, so timers of the sprites depend only on the number of steps."""
+    def __init__(self, start = 0):
+        self.time = start
+        self.elapsed = 0
+
+    def get_ticks(self):
+        return int(self.time)
+
+    def advance(self, ms):
+        """Move the time forward, elapsed is set to the whole ms passed."""
+        ticks = self.get_ticks()
+        self.time += ms
+        self.elapsed = self.get_ticks() - ticks
+
+class FixedTimestep:
+    """Accumulator turning real time between frames into a number of simulation steps
+    of 1000 / rate ms. At most max_steps are run in one frame, time over that is dropped,
+    so after a long stall the game slows down instead of running a burst of steps."""
+    def __init__(self, rate, max_steps):
+        self.step_time = 1000 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0
+        self.previous = None
+        self.dropped = 0
+
+    def reset(self):
+        """Start counting from now, e.g. after loading a level. The next frame runs one step."""
+        self.previous = None
+        self.accumulator = 0
+
+    def steps(self):
+        """Return the number of steps to run in this frame."""
+        now = time.perf_counter()
+        if self.previous is None:
+            self.accumulator = self.step_time
+        else:
+            self.accumulator += (now - self.previous) * 1000
+        self.previous = now
+
+        steps = int(self.accumulator // self.step_time)
+        self.accumulator -= steps * self.step_time
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+        return steps
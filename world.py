@@ -0,0 +1,104 @@
+import pickle
+import pygame
+
+SAVED_TYPES = (bool, int, float, str)
+
+class ChunkWorld:
+    """Moving and animated objects of the level divided into square chunks of tiles.
+    Only chunks within radius (in chunks) of the player have their sprites created,
+    so only they are updated and drawn. Sprites further than radius + 1 chunks are evicted:
+    their state is pickled, their image (a frame shared with other sprites) is kept aside
+    and the sprites are killed. Entering the chunk again creates them with the saved state
+    and image, so animations go on where they stopped. Objects which were killed
+    (a taken potion, a beaten enemy) do not come back.
+    Objects are (sprite class, arguments) where arguments start with the tile x, y,
+    they are created in the order of the list."""
+    def __init__(self, game, objects, tile_size, chunk_size, radius):
+        self.game = game
+        self.objects = objects
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        self.radius = radius
+        self.center = None
+        self.active = set()
+        self.sprites = {}
+        self.saved = {}
+        self.saved_images = {}
+        self.waiting = {}
+        for number, (_, args) in enumerate(objects):
+            self.waiting.setdefault(self.chunk_of_tile(args[0], args[1]), []).append(number)
+
+    def chunk_of_tile(self, x, y):
+        return x // self.chunk_size, y // self.chunk_size
+
+    def chunk_of(self, rect):
+        return self.chunk_of_tile(rect.centerx // self.tile_size, rect.centery // self.tile_size)
+
+    def update(self, rect):
+        """Activate chunks around rect (of the player) and evict the distant ones."""
+        center = self.chunk_of(rect)
+        if center == self.center:
+            return
+        self.center = center
+
+        self.active = {key for key in self.active if self.distance(key) <= self.radius + 1}
+        self.evict()
+
+        entering = []
+        for col in range(center[0] - self.radius, center[0] + self.radius + 1):
+            for row in range(center[1] - self.radius, center[1] + self.radius + 1):
+                if (col, row) not in self.active:
+                    self.active.add((col, row))
+                    entering += [(number, None, None) for number in self.waiting.pop((col, row), ())]
+                    if (col, row) in self.saved:
+                        states = pickle.loads(self.saved.pop((col, row)))
+                        images = self.saved_images.pop((col, row))
+                        entering += [(number, state, image) for (number, state), image in zip(states, images)]
+        for number, state, image in sorted(entering, key=lambda item: item[0]):
+            self.create(number, state, image)
+
+    def distance(self, key):
+        return max(abs(key[0] - self.center[0]), abs(key[1] - self.center[1]))
+
+    def create(self, number, state, image):
+        sprite_class, args = self.objects[number]
+        sprite = sprite_class(self.game, *args)
+        sprite.tile_index = (args[1], args[0])
+        if state is not None:
+            rect = state.pop('rect')
+            vars(sprite).update(state)
+            sprite.rect = pygame.Rect(rect)
+            sprite.image = image
+        self.game.tile_grid.track(sprite)
+        self.sprites[sprite] = number
+
+    def evict(self):
+        """Save and kill sprites more than radius + 1 chunks away."""
+        saved = {}
+        images = {}
+        for sprite, number in list(self.sprites.items()):
+            if not sprite.alive():
+                del self.sprites[sprite]
+                continue
+            key = self.chunk_of(sprite.rect)
+            if self.distance(key) > self.radius + 1:
+                state = {name: value for name, value in vars(sprite).items() if type(value) in SAVED_TYPES}
+                state['rect'] = tuple(sprite.rect)
+                saved.setdefault(key, []).append((number, state))
+                images.setdefault(key, []).append(sprite.image)
+                del self.sprites[sprite]
+                self.game.tile_grid.remove(sprite)
+                sprite.kill()
+        for key, states in saved.items():
+            if key in self.saved:
+                states = pickle.loads(self.saved[key]) + states
+            self.saved[key] = pickle.dumps(states, pickle.HIGHEST_PROTOCOL)
+            self.saved_images[key] = self.saved_images.get(key, []) + images[key]
+
+    def stats(self):
+        return {
+            'active chunks': len(self.active),
+            'sprites': len(self.sprites),
+            'saved chunks': len(self.saved),
+            'saved bytes': sum(len(state) for state in self.saved.values()),
+        }